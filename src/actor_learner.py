@@ -0,0 +1,218 @@
+"""Actor processes for asynchronous actor-learner training."""
+import queue
+import random
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from .dqn_agent import apex_epsilons
+from .env_utils import make_vec_env
+from .network import QNetwork
+from .replay_buffer import NStepAccumulator
+
+
+class TransitionSender:
+    """Replay-buffer stand-in on the actor side.
+
+    NStepAccumulator pushes transitions here; they are collected into
+    fixed-size chunks of arrays and put on the learner's queue.
+    """
+
+    def __init__(self, out_queue, obs_shape, chunk_size=64):
+        self.queue = out_queue
+        self.chunk_size = chunk_size
+        self.states = np.zeros((chunk_size, *obs_shape), dtype=np.uint8)
+        self.actions = np.zeros(chunk_size, dtype=np.int64)
+        self.rewards = np.zeros(chunk_size, dtype=np.float32)
+        self.next_states = np.zeros((chunk_size, *obs_shape), dtype=np.uint8)
+        self.dones = np.zeros(chunk_size, dtype=np.float32)
+        self.discounts = np.zeros(chunk_size, dtype=np.float32)
+        self.count = 0
+
+    def push(self, state, action, reward, next_state, done, discount):
+        i = self.count
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.discounts[i] = discount
+        self.count += 1
+        if self.count == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Send the partial chunk, if any."""
+        if self.count == 0:
+            return
+        n = self.count
+        # Copies: the queue pickles in a feeder thread, after we reuse the arrays
+        self.queue.put(("transitions", (
+            self.states[:n].copy(), self.actions[:n].copy(), self.rewards[:n].copy(),
+            self.next_states[:n].copy(), self.dones[:n].copy(), self.discounts[:n].copy(),
+        )))
+        self.count = 0
+
+
+def run_actor(actor_id, config, shared_network, weights_lock, weights_version, shared_epsilon,
+              env_epsilons, stop_event, out_queue, seed):
+    """Actor process: collect n-step transitions with a synced copy of the Q-network.
+
+    Each actor steps its own make_vec_env vector of env.num_envs envs. New
+    weights are loaded whenever the learner has bumped weights_version.
+    With env_epsilons None every env explores with the learner's current
+    epsilon, otherwise with its fixed per-env value.
+    """
+    torch.set_num_threads(1)
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    use_shaping = config["reward_shaping"]["enabled"]
+    envs = make_vec_env(config, reward_shaping=use_shaping)
+    num_envs = envs.num_envs
+    obs_shape = envs.single_observation_space.shape
+    network = QNetwork(obs_shape, envs.single_action_space.n)
+    network.eval()
+    local_version = -1
+
+    sender = TransitionSender(out_queue, obs_shape, config["training"].get("actor_chunk_size", 64))
+    n_step = config["agent"].get("n_step", 1)
+    builders = [NStepAccumulator(sender, n_step, config["agent"]["gamma"]) for _ in range(num_envs)]
+    episode_rewards = np.zeros(num_envs)
+    episode_original_rewards = np.zeros(num_envs)
+    episode_lengths = np.zeros(num_envs, dtype=np.int64)
+
+    obs, _ = envs.reset(seed=seed)
+    while not stop_event.is_set():
+        if weights_version.value != local_version:
+            with weights_lock:
+                network.load_state_dict(shared_network.state_dict())
+                local_version = weights_version.value
+
+        epsilons = shared_epsilon.value if env_epsilons is None else env_epsilons
+        explore = np.random.random(num_envs) < epsilons
+        actions = np.random.randint(envs.single_action_space.n, size=num_envs)
+        if not explore.all():
+            with torch.no_grad():
+                greedy = network(torch.as_tensor(obs)).argmax(dim=1).numpy()
+            actions = np.where(explore, actions, greedy)
+
+        next_obs, rewards, terminated, truncated, infos = envs.step(actions)
+        dones = terminated | truncated
+        for i in range(num_envs):
+            if dones[i]:
+                next_state = infos["final_observation"][i]
+                original_reward = infos["final_info"][i].get("original_reward", rewards[i])
+            else:
+                next_state = next_obs[i]
+                original_reward = infos["original_reward"][i] if "original_reward" in infos else rewards[i]
+            episode_original_rewards[i] += original_reward
+            episode_rewards[i] += rewards[i]
+            episode_lengths[i] += 1
+            builders[i].push(obs[i], actions[i], rewards[i], next_state, float(dones[i]))
+
+            if dones[i]:
+                # Transitions first, so the learner has them when it logs the episode
+                sender.flush()
+                out_queue.put(("episode", (
+                    float(episode_original_rewards[i]), float(episode_rewards[i]), int(episode_lengths[i]),
+                )))
+                episode_rewards[i] = 0
+                episode_original_rewards[i] = 0
+                episode_lengths[i] = 0
+        obs = next_obs
+
+    envs.close()
+    out_queue.put(("stopped", actor_id))
+
+
+class ActorPool:
+    """N actor processes streaming transitions to the learner over a queue.
+
+    The learner publishes weights into a shared-memory QNetwork with
+    sync(); actors pick them up at their next step.
+    """
+
+    def __init__(self, config, obs_shape, n_actions, q_network, epsilon):
+        self.num_actors = config["training"]["num_actors"]
+        ctx = mp.get_context("spawn")
+        self.queue = ctx.Queue(maxsize=config["training"].get("actor_queue_size", 256))
+        self.stop_event = ctx.Event()
+        self.weights_lock = ctx.Lock()
+        self.weights_version = ctx.Value("i", 0)
+        self.epsilon = ctx.Value("d", epsilon)
+        self.shared_network = QNetwork(obs_shape, n_actions)
+        self.shared_network.share_memory()
+        self.sync(q_network, epsilon)
+
+        # Ape-X rates are spread over every env of every actor
+        num_envs = config["env"].get("num_envs", 1)
+        self.env_epsilons = None
+        if config["agent"].get("epsilon_schedule", "linear") == "apex":
+            self.env_epsilons = apex_epsilons(
+                self.num_actors * num_envs,
+                config["agent"].get("apex_epsilon_base", 0.4),
+                config["agent"].get("apex_epsilon_alpha", 7.0),
+            )
+
+        self.processes = []
+        for actor_id in range(self.num_actors):
+            env_epsilons = None
+            if self.env_epsilons is not None:
+                env_epsilons = self.env_epsilons[actor_id * num_envs:(actor_id + 1) * num_envs]
+            process = ctx.Process(
+                target=run_actor,
+                args=(actor_id, config, self.shared_network, self.weights_lock, self.weights_version,
+                      self.epsilon, env_epsilons, self.stop_event, self.queue,
+                      config["seed"] + 1000 * (actor_id + 1)),
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+
+    def sync(self, q_network, epsilon):
+        """Publish the learner's weights and epsilon to the actors."""
+        with self.weights_lock:
+            for name, tensor in q_network.state_dict().items():
+                self.shared_network.state_dict()[name].copy_(tensor.detach().cpu())
+            self.weights_version.value += 1
+        self.epsilon.value = epsilon
+
+    def poll(self, block=False, max_messages=64):
+        """Up to max_messages queued (kind, payload) messages.
+
+        With block, waits until at least one message arrives.
+        """
+        messages = []
+        while len(messages) < max_messages:
+            try:
+                if block and not messages:
+                    messages.append(self.queue.get(timeout=1.0))
+                else:
+                    messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                if not block or messages:
+                    break
+                self._check_actors()
+        return messages
+
+    def _check_actors(self):
+        for process in self.processes:
+            if process.exitcode not in (None, 0):
+                raise RuntimeError(f"Actor process {process.pid} exited with code {process.exitcode}")
+
+    def close(self):
+        """Stop the actors, discarding whatever they still send."""
+        self.stop_event.set()
+        stopped = 0
+        while stopped < self.num_actors:
+            try:
+                kind, _ = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                self._check_actors()
+                continue
+            if kind == "stopped":
+                stopped += 1
+        for process in self.processes:
+            process.join()
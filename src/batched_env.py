@@ -0,0 +1,284 @@
+"""Pure-NumPy batched simulator for the MiniGrid Empty-NxN environments."""
+import re
+import time
+import argparse
+import numpy as np
+import gymnasium as gym
+from gymnasium.vector import VectorEnv
+from minigrid.core.constants import COLOR_TO_IDX, DIR_TO_VEC, OBJECT_TO_IDX
+
+from .distance_map import DistanceMap
+
+ENV_NAME_PATTERN = re.compile(r"MiniGrid-Empty-(Random-)?(\d+)x(\d+)-v0")
+
+EMPTY = (OBJECT_TO_IDX["empty"], 0, 0)
+WALL = (OBJECT_TO_IDX["wall"], COLOR_TO_IDX["grey"], 0)
+GOAL = (OBJECT_TO_IDX["goal"], COLOR_TO_IDX["green"], 0)
+
+ACTION_LEFT, ACTION_RIGHT, ACTION_FORWARD = 0, 1, 2
+
+
+def view_offsets(view_size):
+    """Offsets (dx, dy) from the agent to every cell of its egocentric view.
+
+    Returns an array of shape (4, view_size, view_size, 2) indexed by agent
+    direction and view cell. This reproduces MiniGridEnv.get_view_exts,
+    Grid.slice and the (direction + 1) Grid.rotate_left calls of
+    gen_obs_grid on index arrays instead of WorldObj grids.
+    """
+    v = view_size
+    h = v // 2
+    tops = {0: (0, -h), 1: (-h, 0), 2: (-v + 1, -h), 3: (-h, -v + 1)}
+    i, j = np.meshgrid(np.arange(v), np.arange(v), indexing="ij")
+
+    offsets = np.zeros((4, v, v, 2), dtype=np.int64)
+    for direction, (top_x, top_y) in tops.items():
+        dx, dy = top_x + i, top_y + j
+        for _ in range(direction + 1):
+            # rotate_left: new[j, v - 1 - i] = old[i, j]
+            dx, dy = np.rot90(dx, -1), np.rot90(dy, -1)
+        offsets[direction, ..., 0] = dx
+        offsets[direction, ..., 1] = dy
+    return offsets
+
+
+class BatchedEmptyEnv(VectorEnv):
+    """Vectorized MiniGrid-Empty-NxN with NumPy state for every sub-env.
+
+    Agent positions, directions and step counts are arrays, and a step is a
+    handful of array operations regardless of num_envs. The grid never
+    changes in Empty, so every possible egocentric view is precomputed into
+    a (width, height, 4) table of CHW uint8 observations. Those match
+    ImgObsWrapper + ObsPreprocessWrapper output on the same state (see
+    validate()). Rewards, termination on the goal and max_steps truncation
+    follow MiniGridEnv.step.
+
+    With reward_shaping the PBRS bonus of RewardShapingWrapper is applied
+    per sub-env, and infos carry the same keys. Finished sub-envs are reset
+    automatically and their last observation/info are returned under
+    "final_observation"/"final_info", like gymnasium's SyncVectorEnv.
+
+    Random-start variants draw start cells and directions uniformly from
+    this env's own RNG. They are not RNG-identical to minigrid's
+    place_agent.
+    """
+
+    def __init__(self, num_envs, size=8, max_steps=None, random_start=False,
+                 reward_shaping=False, shaping_gamma=0.99, shaping_scale=1.0,
+                 view_size=7, seed=None):
+        self.size = size
+        self.max_steps = max_steps if max_steps is not None else 4 * size ** 2
+        self.random_start = random_start
+        self.reward_shaping = reward_shaping
+        self.shaping_gamma = shaping_gamma
+        self.shaping_scale = shaping_scale
+        self.view_size = view_size
+        self.rng = np.random.default_rng(seed)
+
+        # Encoded grid indexed [x, y]: wall border, goal in the far corner
+        self.grid = np.empty((size, size, 3), dtype=np.uint8)
+        self.grid[:] = WALL
+        self.grid[1:-1, 1:-1] = EMPTY
+        self.goal_pos = np.array([size - 2, size - 2])
+        self.grid[tuple(self.goal_pos)] = GOAL
+
+        self.obs_table = self._build_obs_table()
+        self.dir_vec = np.array(DIR_TO_VEC)
+
+        super().__init__(
+            num_envs,
+            gym.spaces.Box(0, 255, shape=(3, view_size, view_size), dtype=np.uint8),
+            gym.spaces.Discrete(7),
+        )
+
+        self.agent_pos = np.zeros((num_envs, 2), dtype=np.int64)
+        self.agent_dir = np.zeros(num_envs, dtype=np.int64)
+        self.step_count = np.zeros(num_envs, dtype=np.int64)
+        self.prev_potential = np.zeros(num_envs)
+        self.distance_map = DistanceMap(self.grid)
+
+    @classmethod
+    def from_config(cls, config, num_envs, reward_shaping=False):
+        """Build the simulator for config["env"]["name"] (an Empty-NxN id)."""
+        name = config["env"]["name"]
+        match = ENV_NAME_PATTERN.fullmatch(name)
+        if match is None or match.group(2) != match.group(3):
+            raise ValueError(f"The numpy backend only simulates MiniGrid-Empty-NxN, not {name}")
+        return cls(
+            num_envs,
+            size=int(match.group(2)),
+            max_steps=config["env"]["max_steps"],
+            random_start=match.group(1) is not None,
+            reward_shaping=reward_shaping,
+            shaping_gamma=config["agent"]["gamma"],
+            shaping_scale=config["reward_shaping"].get("scale", 1.0),
+            seed=config.get("seed"),
+        )
+
+    def _build_obs_table(self):
+        """Observation for every (x, y, direction) of the agent, as CHW uint8."""
+        v = self.view_size
+        # Cells outside the grid read as walls, as in Grid.slice
+        padded = np.empty((self.size + 2 * v, self.size + 2 * v, 3), dtype=np.uint8)
+        padded[:] = WALL
+        padded[v:-v, v:-v] = self.grid
+
+        offsets = view_offsets(v)
+        xs = np.arange(self.size)[:, None, None, None, None] + offsets[None, None, ..., 0] + v
+        ys = np.arange(self.size)[None, :, None, None, None] + offsets[None, None, ..., 1] + v
+        table = padded[xs, ys]  # (x, y, dir, view_x, view_y, 3)
+        # gen_obs_grid clears the agent's own cell when it carries nothing
+        table[..., v // 2, v - 1, :] = EMPTY
+        return np.ascontiguousarray(table.transpose(0, 1, 2, 5, 3, 4))
+
+    def _observe(self, env_ids=slice(None)):
+        pos = self.agent_pos[env_ids]
+        return self.obs_table[pos[:, 0], pos[:, 1], self.agent_dir[env_ids]]
+
+    def _potential(self, env_ids=slice(None)):
+        """PBRS potential of RewardShapingWrapper, looked up for every sub-env at once."""
+        return self.shaping_scale * self.distance_map.potential(self.agent_pos[env_ids])
+
+    def _reset_envs(self, env_ids):
+        n = len(env_ids)
+        if self.random_start:
+            cells = np.argwhere(self.grid[..., 0] == EMPTY[0])
+            self.agent_pos[env_ids] = cells[self.rng.integers(len(cells), size=n)]
+            self.agent_dir[env_ids] = self.rng.integers(4, size=n)
+        else:
+            self.agent_pos[env_ids] = (1, 1)
+            self.agent_dir[env_ids] = 0
+        self.step_count[env_ids] = 0
+        if self.reward_shaping:
+            self.prev_potential[env_ids] = self._potential(env_ids)
+
+    def reset(self, seed=None, options=None):
+        """Reset every sub-env."""
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self._reset_envs(np.arange(self.num_envs))
+        return self._observe(), {}
+
+    def step(self, actions):
+        """Step every sub-env; finished ones are reset automatically."""
+        actions = np.asarray(actions)
+        self.step_count += 1
+
+        left = actions == ACTION_LEFT
+        right = actions == ACTION_RIGHT
+        forward = actions == ACTION_FORWARD
+        self.agent_dir[left] = (self.agent_dir[left] - 1) % 4
+        self.agent_dir[right] = (self.agent_dir[right] + 1) % 4
+
+        front = self.agent_pos + self.dir_vec[self.agent_dir]
+        front_obj = self.grid[front[:, 0], front[:, 1], 0]
+        # pickup/drop/toggle/done are no-ops: nothing in Empty reacts to them
+        move = forward & (front_obj != WALL[0])
+        self.agent_pos[move] = front[move]
+
+        terminated = forward & (front_obj == GOAL[0])
+        truncated = self.step_count >= self.max_steps
+        rewards = np.where(terminated, 1 - 0.9 * (self.step_count / self.max_steps), 0.0)
+
+        infos = {}
+        if self.reward_shaping:
+            potential = self._potential()
+            shaping = self.shaping_gamma * potential - self.prev_potential
+            self.prev_potential = potential
+            infos["original_reward"] = rewards
+            infos["shaped_reward"] = rewards + shaping
+            infos["shaping_bonus"] = shaping
+            rewards = rewards + shaping
+
+        obs = self._observe()
+        dones = terminated | truncated
+        if dones.any():
+            done_ids = np.flatnonzero(dones)
+            live = ~dones
+            final_observation = np.full(self.num_envs, None, dtype=object)
+            final_info = np.full(self.num_envs, None, dtype=object)
+            for i in done_ids:
+                final_observation[i] = obs[i].copy()
+                final_info[i] = {key: infos[key][i] for key in infos}
+            for key in list(infos):
+                infos[f"_{key}"] = live
+            infos["final_observation"] = final_observation
+            infos["_final_observation"] = dones
+            infos["final_info"] = final_info
+            infos["_final_info"] = dones
+
+            self._reset_envs(done_ids)
+            obs[done_ids] = self._observe(done_ids)
+        else:
+            for key in list(infos):
+                infos[f"_{key}"] = np.ones(self.num_envs, dtype=bool)
+
+        return obs, rewards, terminated, truncated, infos
+
+
+def validate(config, num_steps=10000, seed=0, reward_shaping=False):
+    """Step BatchedEmptyEnv against make_env with identical actions.
+
+    Returns the number of steps compared, or raises AssertionError at the
+    first step where observation, reward, terminated or truncated differ.
+    """
+    from .env_utils import make_env
+
+    rng = np.random.default_rng(seed)
+    reference = make_env(config, reward_shaping=reward_shaping)
+    batched = BatchedEmptyEnv.from_config(config, 1, reward_shaping=reward_shaping)
+    if batched.random_start:
+        raise ValueError("Step-by-step validation needs a fixed-start Empty env")
+
+    ref_obs, _ = reference.reset(seed=seed)
+    obs, _ = batched.reset(seed=seed)
+    assert np.array_equal(ref_obs, obs[0]), "reset observations differ"
+
+    # Bias towards forward so episodes regularly reach the goal
+    probs = np.array([0.2, 0.2, 0.45, 0.05, 0.04, 0.03, 0.03])
+    for t in range(num_steps):
+        action = rng.choice(7, p=probs)
+        ref_obs, ref_reward, ref_term, ref_trunc, _ = reference.step(action)
+        obs, rewards, terminated, truncated, infos = batched.step([action])
+
+        done = ref_term or ref_trunc
+        step_obs = infos["final_observation"][0] if done else obs[0]
+        assert np.array_equal(ref_obs, step_obs), f"observations differ at step {t}"
+        assert np.isclose(ref_reward, rewards[0]), f"rewards differ at step {t}"
+        assert (ref_term, ref_trunc) == (terminated[0], truncated[0]), f"done flags differ at step {t}"
+
+        if done:
+            ref_obs, _ = reference.reset()
+            assert np.array_equal(ref_obs, obs[0]), f"reset observations differ at step {t}"
+
+    reference.close()
+    return num_steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and benchmark the batched Empty simulator")
+    parser.add_argument("--config", type=str, default="configs/default.yaml", help="Path to config YAML")
+    parser.add_argument("--steps", type=int, default=10000, help="Steps to compare against minigrid")
+    parser.add_argument("--num_envs", type=int, default=1024, help="Batch size for the benchmark")
+    args = parser.parse_args()
+
+    from .config import load_config
+    config = load_config(args.config)
+
+    for shaping in (False, True):
+        validate(config, args.steps, reward_shaping=shaping)
+        print(f"Validated {args.steps} steps against {config['env']['name']} (reward shaping: {shaping})")
+
+    envs = BatchedEmptyEnv.from_config(config, args.num_envs)
+    envs.reset(seed=0)
+    rng = np.random.default_rng(0)
+    actions = rng.integers(3, size=(200, args.num_envs))
+    start = time.perf_counter()
+    for step_actions in actions:
+        envs.step(step_actions)
+    elapsed = time.perf_counter() - start
+    print(f"Throughput: {len(actions) * args.num_envs / elapsed:,.0f} env-steps/s with {args.num_envs} envs")
+
+
+if __name__ == "__main__":
+    main()
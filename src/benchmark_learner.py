@@ -0,0 +1,61 @@
+"""Measure DQNAgent.update throughput on a replay buffer of random transitions."""
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import load_config
+from src.env_utils import make_env
+from src.dqn_agent import DQNAgent
+
+
+def benchmark(config, num_updates=2000, warmup=100, num_transitions=10000):
+    """Return learner updates per second after `warmup` untimed updates."""
+    env = make_env(config)
+    obs_shape = env.observation_space.shape
+    n_actions = env.action_space.n
+    env.close()
+
+    agent = DQNAgent(obs_shape, n_actions, config)
+    rng = np.random.default_rng(0)
+    for _ in range(num_transitions):
+        agent.buffer.push(
+            rng.integers(0, 11, obs_shape, dtype=np.uint8), rng.integers(n_actions), rng.random(),
+            rng.integers(0, 11, obs_shape, dtype=np.uint8), float(rng.random() < 0.01),
+            config["agent"]["gamma"],
+        )
+
+    for _ in range(warmup):
+        agent.update()
+    start = time.perf_counter()
+    for _ in range(num_updates):
+        agent.update()
+    return num_updates / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DQN learner step")
+    parser.add_argument("--config", type=str, default="configs/default.yaml")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--compile", action="store_true", help="Enable agent.compile")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.compile:
+        config["agent"]["compile"] = True
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    ups = benchmark(config, args.updates, args.warmup)
+    print(f"{ups:,.0f} updates/s (batch {config['agent']['batch_size']}, device {config.get('device', 'cpu')}, "
+          f"compile {config['agent'].get('compile', False)})")
+
+
+if __name__ == "__main__":
+    main()
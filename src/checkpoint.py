@@ -0,0 +1,261 @@
+"""Atomic checkpoint files, written on a background thread with retention."""
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+import torch
+
+CHECKPOINT_PATTERN = re.compile(r"checkpoint_ep(\d+)\.(pt|ckpt)")
+# Manifest of a checkpoint in a CheckpointStore
+MANIFEST_SUFFIX = ".ckpt"
+# Checkpoint entries stored as separate blobs; everything else is metadata
+BLOB_PARTS = ("q_network", "target_network", "optimizer")
+
+
+def cpu_copy(obj):
+    """Deep copy of nested dicts/lists with every tensor detached and copied to CPU."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: cpu_copy(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(cpu_copy(value) for value in obj)
+    return obj
+
+
+def atomic_save(obj, path):
+    """torch.save to a temporary file, fsync it and rename it over path.
+
+    Readers (and a crash at any point) see either the previous file or the
+    complete new one, never a partial write.
+    """
+    atomic_write(path, lambda f: torch.save(obj, f))
+
+
+def atomic_write(path, write):
+    """Call write(f) on a temporary file, fsync it and rename it over path."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, path)
+    # Persist the rename itself
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def content_hash(obj):
+    """SHA-256 of nested dicts/lists of tensors and scalars, by value.
+
+    Tensors contribute dtype, shape and raw bytes, so equal state dicts hash
+    equally however their storages happen to be laid out.
+    """
+    digest = hashlib.sha256()
+
+    def update(value):
+        if isinstance(value, torch.Tensor):
+            value = value.detach().cpu().contiguous()
+            digest.update(f"T{value.dtype}{tuple(value.shape)}".encode())
+            digest.update(value.reshape(-1).view(torch.uint8).numpy().tobytes())
+        elif isinstance(value, dict):
+            digest.update(f"D{len(value)}".encode())
+            for key, item in value.items():
+                update(key)
+                update(item)
+        elif isinstance(value, (list, tuple)):
+            digest.update(f"L{len(value)}".encode())
+            for item in value:
+                update(item)
+        else:
+            digest.update(f"S{type(value).__name__}:{value!r}".encode())
+
+    update(obj)
+    return digest.hexdigest()
+
+
+def read_manifest(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def find_checkpoint(run_dir, name):
+    """Path of checkpoint `name` in run_dir (store manifest or .pt file), or None."""
+    for suffix in (MANIFEST_SUFFIX, ".pt"):
+        path = Path(run_dir) / f"{name}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def load_checkpoint(path, parts=BLOB_PARTS, map_location=None):
+    """Load a checkpoint's metadata and the state dicts named in `parts`.
+
+    Reads a CheckpointStore manifest (only the requested blobs are opened)
+    or a single .pt file (memory-mapped, so unused entries are not read).
+    """
+    path = Path(path)
+    if path.suffix == MANIFEST_SUFFIX:
+        manifest = read_manifest(path)
+        checkpoint = dict(manifest["metadata"])
+        for part in parts:
+            blob_path = path.parent / "blobs" / f"{manifest['blobs'][part]}.pt"
+            checkpoint[part] = torch.load(blob_path, map_location=map_location, weights_only=True)
+        return checkpoint
+
+    checkpoint = torch.load(path, map_location=map_location, weights_only=True, mmap=True)
+    return {key: value for key, value in checkpoint.items() if key in parts or key not in BLOB_PARTS}
+
+
+class CheckpointStore:
+    """Content-addressed checkpoints of one run directory.
+
+    A checkpoint is a small JSON manifest, <name>.ckpt, holding the
+    metadata (epsilon, step and update counts) and the hashes of its
+    q_network, target_network and optimizer state dicts. Each state dict is
+    stored once as blobs/<hash>.pt, so checkpoints with identical parts
+    (e.g. the last periodic checkpoint and final_model) share the files,
+    and evaluation can load the Q-network alone.
+    """
+
+    def __init__(self, run_dir):
+        self.run_dir = Path(run_dir)
+        self.blob_dir = self.run_dir / "blobs"
+
+    def save(self, state, name):
+        blobs = {}
+        for part in BLOB_PARTS:
+            digest = content_hash(state[part])
+            blob_path = self.blob_dir / f"{digest}.pt"
+            if not blob_path.exists():
+                atomic_save(state[part], blob_path)
+            blobs[part] = digest
+        metadata = {key: value.item() if isinstance(value, np.generic) else value
+                    for key, value in state.items() if key not in BLOB_PARTS}
+        manifest = json.dumps({"blobs": blobs, "metadata": metadata}, indent=2)
+        atomic_write(self.run_dir / f"{name}{MANIFEST_SUFFIX}", lambda f: f.write(manifest.encode()))
+
+    def gc(self):
+        """Delete blobs no manifest refers to (left by pruning or a crash)."""
+        if not self.blob_dir.exists():
+            return
+        referenced = set()
+        for manifest_path in self.run_dir.glob(f"*{MANIFEST_SUFFIX}"):
+            referenced.update(read_manifest(manifest_path)["blobs"].values())
+        for blob_path in self.blob_dir.glob("*.pt"):
+            if blob_path.stem not in referenced:
+                blob_path.unlink(missing_ok=True)
+        for tmp_path in self.blob_dir.glob("*.tmp"):
+            tmp_path.unlink()
+
+
+class CheckpointManager:
+    """Saves agent checkpoints into output_dir without pausing training.
+
+    save() snapshots the agent's state to CPU tensors and returns; a writer
+    thread serializes the snapshot with atomic_save. At most max_pending
+    snapshots wait for the thread, after which save() blocks. With
+    background False everything happens inside save().
+
+    Checkpoints are <name>.pt files, or with store entries of a
+    CheckpointStore. After each write only the keep_last newest
+    checkpoint_ep<N> checkpoints are kept (None keeps all). Other names,
+    such as final_model, are never deleted. Errors from the writer thread
+    are raised by the next save(), wait() or close().
+    """
+
+    def __init__(self, output_dir, keep_last=None, background=True, max_pending=2, store=False):
+        if keep_last is not None and keep_last < 1:
+            raise ValueError(f"keep_last must be at least 1 (or None), got {keep_last}")
+        self.output_dir = Path(output_dir)
+        self.keep_last = keep_last
+        self.error = None
+        # Left behind by a crash during atomic_save
+        for tmp_path in self.output_dir.glob("*.tmp"):
+            if tmp_path.is_file():
+                tmp_path.unlink()
+        self.store = None
+        if store:
+            self.store = CheckpointStore(self.output_dir)
+            self.store.gc()
+
+        self.jobs = None
+        if background:
+            self.jobs = queue.Queue(maxsize=max_pending)
+            self.thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+            self.thread.start()
+
+    def save(self, agent, name):
+        """Checkpoint agent as `name` (without extension) in output_dir."""
+        self._raise_error()
+        state = agent.checkpoint_state()
+        if self.jobs is None:
+            self._write(state, name)
+        else:
+            self.jobs.put((state, name))
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk."""
+        if self.jobs is not None:
+            self.jobs.join()
+        self._raise_error()
+
+    def close(self):
+        if self.jobs is not None:
+            self.jobs.put(None)
+            self.thread.join()
+            self.jobs = None
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("Writing a checkpoint failed") from error
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                self._write(*job)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.jobs.task_done()
+
+    def _write(self, state, name):
+        if self.store is not None:
+            self.store.save(state, name)
+        else:
+            atomic_save(state, self.output_dir / f"{name}.pt")
+        if self.keep_last is not None:
+            self.prune()
+
+    def prune(self):
+        """Delete all but the keep_last newest checkpoint_ep<N> checkpoints."""
+        checkpoints = []
+        for path in self.output_dir.glob("checkpoint_ep*"):
+            match = CHECKPOINT_PATTERN.fullmatch(path.name)
+            if match:
+                checkpoints.append((int(match.group(1)), path))
+        checkpoints.sort()
+        for _, path in checkpoints[:-self.keep_last]:
+            path.unlink(missing_ok=True)
+        if self.store is not None:
+            self.store.gc()
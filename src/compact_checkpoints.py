@@ -0,0 +1,57 @@
+"""Convert single-file .pt checkpoints of finished runs into CheckpointStore entries."""
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.checkpoint import CHECKPOINT_PATTERN, CheckpointStore, load_checkpoint
+
+
+def checkpoint_files(run_dir):
+    """final_model.pt and checkpoint_ep<N>.pt files of one run directory."""
+    paths = []
+    for path in sorted(run_dir.glob("*.pt")):
+        match = CHECKPOINT_PATTERN.fullmatch(path.name)
+        if path.name == "final_model.pt" or (match and match.group(2) == "pt"):
+            paths.append(path)
+    return paths
+
+
+def dir_size(path):
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def compact_run(run_dir, keep=False, dry_run=False):
+    """Store every .pt checkpoint of run_dir; returns the checkpoints converted."""
+    paths = checkpoint_files(run_dir)
+    if dry_run or not paths:
+        return paths
+    store = CheckpointStore(run_dir)
+    for path in paths:
+        store.save(load_checkpoint(path, map_location="cpu"), path.stem)
+        if not keep:
+            path.unlink()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicate .pt checkpoints into content-addressed blobs")
+    parser.add_argument("--results_dir", type=str, required=True, help="Directory of run directories")
+    parser.add_argument("--keep", action="store_true", help="Keep the .pt files after converting them")
+    parser.add_argument("--dry_run", action="store_true", help="Only list the checkpoints to convert")
+    args = parser.parse_args()
+
+    results_dir = Path(args.results_dir)
+    before = dir_size(results_dir)
+    for run_dir in sorted(d for d in results_dir.iterdir() if d.is_dir()):
+        paths = compact_run(run_dir, args.keep, args.dry_run)
+        if paths:
+            print(f"{run_dir.name}: {', '.join(p.name for p in paths)}")
+    if not args.dry_run:
+        after = dir_size(results_dir)
+        print(f"{before / 2 ** 20:.1f} MiB -> {after / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
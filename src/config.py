@@ -14,14 +14,20 @@ def load_config(config_path):
 def parse_args():
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(description="MiniGrid DQN Training")
-    parser.add_argument("--config", type=str, required=True, help="Path to config YAML")
+    parser.add_argument("--config", type=str, default=None,
+                        help="Path to config YAML (defaults to the saved config when resuming)")
     parser.add_argument("--seed", type=int, default=None, help="Override random seed")
     parser.add_argument("--gamma", type=float, default=None, help="Override gamma")
     parser.add_argument("--experiment_name", type=str, default=None, help="Override experiment name")
     parser.add_argument("--output_dir", type=str, default=None, help="Override output directory")
+    parser.add_argument("--resume", type=str, default=None,
+                        help="Experiment directory of an interrupted run to continue")
     args = parser.parse_args()
 
-    config = load_config(args.config)
+    if args.config is None and args.resume is None:
+        parser.error("--config is required unless --resume is given")
+    config_path = args.config or Path(args.resume) / "resume" / "config.yaml"
+    config = load_config(config_path)
 
     # Apply CLI overrides
     if args.seed is not None:
@@ -32,5 +38,7 @@ def parse_args():
         config["experiment_name"] = args.experiment_name
     if args.output_dir is not None:
         config["output_dir"] = args.output_dir
+    if args.resume is not None:
+        config["resume"] = args.resume
 
     return config
@@ -0,0 +1,95 @@
+"""Shortest-path distance-to-goal maps for potential-based reward shaping."""
+from collections import OrderedDict, deque
+
+import numpy as np
+from minigrid.core.constants import OBJECT_TO_IDX, STATE_TO_IDX
+
+# Cells the agent can walk onto; doors only while open. Everything else
+# (walls, lava, keys, balls, boxes, closed or locked doors) blocks.
+PASSABLE = (OBJECT_TO_IDX["unseen"], OBJECT_TO_IDX["empty"], OBJECT_TO_IDX["floor"], OBJECT_TO_IDX["goal"])
+DOOR = OBJECT_TO_IDX["door"]
+DOOR_OPEN = STATE_TO_IDX["open"]
+GOAL = OBJECT_TO_IDX["goal"]
+MOVES = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class DistanceMap:
+    """BFS distance from every cell of a grid layout to the nearest goal.
+
+    encoded is a (width, height, 3) Grid.encode() array. Empty cells,
+    floor, goals and open doors are passable; every other object (walls,
+    lava, keys, balls, boxes, closed and locked doors) blocks movement, so
+    distances route around it. Objects the agent could move or open are
+    treated as fixed. Without a goal the bottom-right interior cell is
+    used, matching the Empty layouts.
+
+    Potentials are 1 - distance / max_distance. max_distance is at least the
+    interior Manhattan span, so open layouts get exactly the Manhattan
+    potentials of Empty. Unreachable cells get potential 0.
+    """
+
+    def __init__(self, encoded):
+        encoded = np.asarray(encoded)
+        object_types = encoded[..., 0]
+        width, height = object_types.shape
+        goals = np.argwhere(object_types == GOAL)
+        if len(goals) == 0:
+            goals = np.array([[width - 2, height - 2]])
+        self.goal_pos = goals[0]
+
+        passable = np.isin(object_types, PASSABLE) | ((object_types == DOOR) & (encoded[..., 2] == DOOR_OPEN))
+        distances = np.full((width, height), -1, dtype=np.int64)
+        queue = deque()
+        for x, y in goals:
+            distances[x, y] = 0
+            queue.append((x, y))
+        while queue:
+            x, y = queue.popleft()
+            for dx, dy in MOVES:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height and passable[nx, ny] and distances[nx, ny] < 0:
+                    distances[nx, ny] = distances[x, y] + 1
+                    queue.append((nx, ny))
+
+        self.max_distance = max(int(distances.max()), (width - 2) + (height - 2), 1)
+        distances[distances < 0] = self.max_distance
+        self.distances = distances
+        self.potentials = 1.0 - distances / self.max_distance
+
+    def potential(self, positions):
+        """Potential at one (x, y) position or at an (n, 2) array of them."""
+        positions = np.asarray(positions)
+        return self.potentials[positions[..., 0], positions[..., 1]]
+
+
+def layout_key(grid):
+    """Exact key of a minigrid Grid's layout: its size, cell types and door states.
+
+    Reads grid.grid directly; much cheaper than grid.encode() on every reset.
+    """
+    return grid.width, grid.height, tuple([
+        None if cell is None else (cell.type, cell.is_open) if cell.type == "door" else cell.type
+        for cell in grid.grid
+    ])
+
+
+class DistanceMapCache:
+    """LRU cache of DistanceMaps keyed by layout_key()."""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.maps = OrderedDict()
+
+    def get(self, grid):
+        """DistanceMap for a minigrid Grid, computed by BFS only for unseen layouts."""
+        key = layout_key(grid)
+        distance_map = self.maps.get(key)
+        if distance_map is not None:
+            self.maps.move_to_end(key)
+            return distance_map
+
+        distance_map = DistanceMap(grid.encode())
+        self.maps[key] = distance_map
+        if len(self.maps) > self.max_size:
+            self.maps.popitem(last=False)
+        return distance_map
@@ -3,16 +3,24 @@ import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from pathlib import Path
 
+from .checkpoint import atomic_save, cpu_copy, load_checkpoint
 from .network import QNetwork
-from .replay_buffer import ReplayBuffer
+from .profiler import NullProfiler
+from .replay_buffer import NStepAccumulator, make_replay_buffer
+
+
+def apex_epsilons(num_envs, base=0.4, alpha=7.0):
+    """Ape-X per-actor exploration rates: base ** (1 + alpha * i / (N - 1))."""
+    if num_envs == 1:
+        return np.array([base])
+    return base ** (1 + alpha * np.arange(num_envs) / (num_envs - 1))
 
 
 class DQNAgent:
     """Deep Q-Network agent."""
 
-    def __init__(self, obs_shape, n_actions, config):
+    def __init__(self, obs_shape, n_actions, config, replay_dir=None):
         self.n_actions = n_actions
         self.gamma = config["agent"]["gamma"]
         self.batch_size = config["agent"]["batch_size"]
@@ -20,26 +28,57 @@ class DQNAgent:
         self.target_update_freq = config["agent"]["target_update_freq"]
         self.device = torch.device(config.get("device", "cpu"))
 
-        # Epsilon schedule
-        self.epsilon = config["agent"]["epsilon_start"]
+        # Epsilon schedule (over environment steps, see set_env_steps)
+        self.epsilon_start = config["agent"]["epsilon_start"]
+        self.epsilon = self.epsilon_start
         self.epsilon_end = config["agent"]["epsilon_end"]
         self.epsilon_decay_steps = config["agent"]["epsilon_decay_steps"]
         self.epsilon_decay = (self.epsilon - self.epsilon_end) / self.epsilon_decay_steps
 
+        # "apex" gives every env a fixed epsilon instead of one decaying value
+        self.env_epsilons = None
+        if config["agent"].get("epsilon_schedule", "linear") == "apex":
+            self.env_epsilons = apex_epsilons(
+                config["env"].get("num_envs", 1),
+                config["agent"].get("apex_epsilon_base", 0.4),
+                config["agent"].get("apex_epsilon_alpha", 7.0),
+            )
+            self.epsilon = float(self.env_epsilons.mean())
+
         # Networks
         self.q_network = QNetwork(obs_shape, n_actions).to(self.device)
         self.target_network = QNetwork(obs_shape, n_actions).to(self.device)
         self.target_network.load_state_dict(self.q_network.state_dict())
         self.target_network.eval()
-
-        # Optimizer
-        self.optimizer = optim.Adam(self.q_network.parameters(), lr=config["agent"]["lr"])
+        self.target_network.requires_grad_(False)
+        # Synced in place by sync_target, without building state dicts
+        self.q_params = list(self.q_network.parameters())
+        self.target_params = list(self.target_network.parameters())
+        self.target_tau = config["agent"].get("target_tau", 1.0)
+
+        # Optimizer (foreach: one fused kernel per step op instead of one per tensor)
+        self.optimizer = optim.Adam(self.q_network.parameters(), lr=config["agent"]["lr"], foreach=True)
+        self.loss_fn = nn.MSELoss()
+
+        # Forward passes and loss used by update(); acting keeps the eager network
+        self.train_q_network = self.q_network
+        self.train_target_network = self.target_network
+        if config["agent"].get("compile", False):
+            self.train_q_network = torch.compile(self.q_network)
+            self.train_target_network = torch.compile(self.target_network)
+            self.loss_fn = torch.compile(self.loss_fn)
 
         # Replay buffer
-        self.buffer = ReplayBuffer(config["agent"]["buffer_size"])
+        self.buffer = make_replay_buffer(config, obs_shape, replay_dir)
+        self.n_step = config["agent"].get("n_step", 1)
+        self.n_step_builders = {}  # one per environment
 
-        # Step counter
+        # Environment steps seen and gradient updates done
         self.total_steps = 0
+        self.num_updates = 0
+
+        # Phase timings of update() and sync_target(); set by the training loop
+        self.profiler = NullProfiler()
 
     def select_action(self, state, evaluate=False):
         """Epsilon-greedy action selection."""
@@ -47,72 +86,162 @@ class DQNAgent:
             return np.random.randint(self.n_actions)
 
         with torch.no_grad():
-            state_t = torch.FloatTensor(state).unsqueeze(0).to(self.device)
+            state_t = torch.as_tensor(state, device=self.device).unsqueeze(0)
             q_values = self.q_network(state_t)
             return q_values.argmax(dim=1).item()
 
-    def store_transition(self, state, action, reward, next_state, done):
-        """Store transition in replay buffer."""
-        self.buffer.push(state, action, reward, next_state, done)
+    def select_actions(self, states, evaluate=False, epsilons=None):
+        """Epsilon-greedy actions for a batch of observations.
+
+        Exploration is decided with one vectorized random draw and all
+        greedy actions come from a single batched forward pass. `epsilons`
+        (a scalar or one value per observation) defaults to the per-env
+        Ape-X rates, or to the current epsilon of the linear schedule.
+        """
+        n = len(states)
+        if evaluate:
+            explore = np.zeros(n, dtype=bool)
+        else:
+            if epsilons is None:
+                epsilons = self.epsilon if self.env_epsilons is None else self.env_epsilons
+            explore = np.random.random(n) < epsilons
+        actions = np.zeros(n, dtype=np.int64)
+        if explore.any():
+            actions[explore] = np.random.randint(self.n_actions, size=explore.sum())
+
+        if not explore.all():
+            with torch.no_grad():
+                states_t = torch.as_tensor(states, device=self.device)
+                greedy = self.q_network(states_t).argmax(dim=1).cpu().numpy()
+            actions = np.where(explore, actions, greedy)
+        return actions
+
+    def store_transition(self, state, action, reward, next_state, done, env_id=0):
+        """Store transition in replay buffer (as an n-step transition).
+
+        `env_id` keeps the n-step returns of parallel environments apart.
+        """
+        if env_id not in self.n_step_builders:
+            self.n_step_builders[env_id] = NStepAccumulator(self.buffer, self.n_step, self.gamma)
+        self.n_step_builders[env_id].push(state, action, reward, next_state, done)
+
+    def pending_state(self):
+        """In-progress n-step entries of every environment (for resuming)."""
+        return {env_id: builder.state_dict() for env_id, builder in self.n_step_builders.items()}
+
+    def load_pending_state(self, state):
+        """Restore entries saved by pending_state."""
+        for env_id, builder_state in state.items():
+            builder = NStepAccumulator(self.buffer, self.n_step, self.gamma)
+            builder.load_state_dict(builder_state)
+            self.n_step_builders[env_id] = builder
+
+    def _to_device(self, array):
+        """Move a sampled array or tensor to the agent's device without copying on CPU."""
+        return torch.as_tensor(array).to(self.device, non_blocking=True)
 
     def update(self):
         """Perform one gradient update step."""
         if len(self.buffer) < self.batch_size:
             return None
 
-        # Sample batch
-        states, actions, rewards, next_states, dones = self.buffer.sample(self.batch_size)
-
-        states_t = torch.FloatTensor(states).to(self.device)
-        actions_t = torch.LongTensor(actions).to(self.device)
-        rewards_t = torch.FloatTensor(rewards).to(self.device)
-        next_states_t = torch.FloatTensor(next_states).to(self.device)
-        dones_t = torch.FloatTensor(dones).to(self.device)
-
-        # Current Q values
-        q_values = self.q_network(states_t).gather(1, actions_t.unsqueeze(1)).squeeze(1)
+        profiler = self.profiler
 
-        # Target Q values
-        with torch.no_grad():
-            if self.use_target_network:
-                next_q_values = self.target_network(next_states_t).max(dim=1)[0]
+        # Sample batch
+        with profiler.phase("replay_sample"):
+            batch = self.buffer.sample(self.batch_size)
+
+        # Observations stay uint8 until QNetwork.forward normalizes them
+        with profiler.phase("to_tensor"):
+            states_t = self._to_device(batch.states)
+            actions_t = self._to_device(batch.actions)
+            rewards_t = self._to_device(batch.rewards)
+            next_states_t = self._to_device(batch.next_states)
+            dones_t = self._to_device(batch.dones)
+            discounts_t = self._to_device(batch.discounts)
+            weights_t = self._to_device(batch.weights) if batch.weights is not None else None
+
+        with profiler.phase("forward"):
+            # Current Q values
+            q_values = self.train_q_network(states_t).gather(1, actions_t.unsqueeze(1)).squeeze(1)
+
+            # Target Q values
+            with torch.inference_mode():
+                if self.use_target_network:
+                    next_q_values = self.train_target_network(next_states_t).max(dim=1)[0]
+                else:
+                    next_q_values = self.train_q_network(next_states_t).max(dim=1)[0]
+            # Outside inference mode: the loss saves the target for backward
+            target = rewards_t + discounts_t * next_q_values * (1 - dones_t)
+
+            # Loss
+            if weights_t is not None:
+                # Prioritized replay: importance-weighted loss, TD errors as new priorities
+                td_errors = target - q_values
+                loss = (weights_t * td_errors.pow(2)).mean()
+                self.buffer.update_priorities(batch.indices, td_errors.detach().cpu().numpy())
             else:
-                next_q_values = self.q_network(next_states_t).max(dim=1)[0]
-            target = rewards_t + self.gamma * next_q_values * (1 - dones_t)
+                loss = self.loss_fn(q_values, target)
 
-        # Loss and update
-        loss = nn.MSELoss()(q_values, target)
-        self.optimizer.zero_grad()
-        loss.backward()
-        self.optimizer.step()
+        with profiler.phase("backward"):
+            self.optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+        with profiler.phase("optimizer_step"):
+            self.optimizer.step()
 
-        # Update epsilon
-        self.total_steps += 1
-        self.epsilon = max(self.epsilon_end, self.epsilon - self.epsilon_decay)
-
-        # Update target network
-        if self.use_target_network and self.total_steps % self.target_update_freq == 0:
-            self.target_network.load_state_dict(self.q_network.state_dict())
+        self.num_updates += 1
+        if self.use_target_network and self.target_tau < 1.0:
+            self.sync_target()
 
         return loss.item()
 
-    def save(self, path):
-        """Save model checkpoint."""
-        path = Path(path)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        torch.save({
+    def set_env_steps(self, env_steps):
+        """Advance epsilon and hard target syncs to env_steps environment steps.
+
+        Both schedules count environment steps, so they do not depend on
+        how many updates the training loop runs per step.
+        """
+        if self.env_epsilons is None:
+            self.epsilon = max(self.epsilon_end, self.epsilon_start - self.epsilon_decay * env_steps)
+        if (self.use_target_network and self.target_tau >= 1.0
+                and env_steps // self.target_update_freq > self.total_steps // self.target_update_freq):
+            self.sync_target()
+        self.total_steps = env_steps
+
+    def sync_target(self):
+        """Copy the online weights into the target network in place.
+
+        With target_tau < 1 the target is Polyak-averaged towards the online
+        network instead (called every update rather than every
+        target_update_freq env steps).
+        """
+        with self.profiler.phase("target_sync"), torch.no_grad():
+            if self.target_tau < 1.0:
+                torch._foreach_lerp_(self.target_params, self.q_params, self.target_tau)
+            else:
+                torch._foreach_copy_(self.target_params, self.q_params)
+
+    def checkpoint_state(self):
+        """Checkpoint contents, copied to CPU so later updates do not change them."""
+        return cpu_copy({
             "q_network": self.q_network.state_dict(),
             "target_network": self.target_network.state_dict(),
             "optimizer": self.optimizer.state_dict(),
             "epsilon": self.epsilon,
             "total_steps": self.total_steps,
-        }, path)
+            "num_updates": self.num_updates,
+        })
+
+    def save(self, path):
+        """Save model checkpoint (atomically: the file is complete or untouched)."""
+        atomic_save(self.checkpoint_state(), path)
 
     def load(self, path):
-        """Load model checkpoint."""
-        checkpoint = torch.load(path, map_location=self.device, weights_only=True)
+        """Load model checkpoint (a .pt file or a CheckpointStore manifest)."""
+        checkpoint = load_checkpoint(path, map_location=self.device)
         self.q_network.load_state_dict(checkpoint["q_network"])
         self.target_network.load_state_dict(checkpoint["target_network"])
         self.optimizer.load_state_dict(checkpoint["optimizer"])
         self.epsilon = checkpoint["epsilon"]
         self.total_steps = checkpoint["total_steps"]
+        self.num_updates = checkpoint.get("num_updates", 0)
@@ -4,12 +4,22 @@ import gymnasium as gym
 import minigrid
 from minigrid.wrappers import ImgObsWrapper
 
+from .batched_env import BatchedEmptyEnv
+from .distance_map import DistanceMapCache
+
+# Distance maps shared by every RewardShapingWrapper in the process
+DISTANCE_MAPS = DistanceMapCache()
+
 
 class RewardShapingWrapper(gym.Wrapper):
     """Potential-Based Reward Shaping (PBRS) wrapper.
 
     Adds shaped reward: r_shaped = r_original + gamma * Phi(s') - Phi(s)
-    where Phi(s) = 1 - (manhattan_distance_to_goal / max_distance)
+    where Phi(s) = 1 - (shortest_path_distance_to_goal / max_distance)
+
+    Distances come from a BFS DistanceMap per grid layout, cached by layout
+    (cell types and door states) and shared by all wrappers, so resets of a known layout and every
+    potential are table lookups.
 
     Reference: Ng et al., 1999 - Policy invariance under reward transformations.
     """
@@ -19,39 +29,20 @@ class RewardShapingWrapper(gym.Wrapper):
         self.gamma = gamma
         self.scale = scale
         self.prev_potential = None
-        # Goal is always at bottom-right corner in Empty env (width-2, height-2)
-        self.goal_pos = None
-        self.max_distance = None
+        self.distance_map = None
 
     def _get_agent_pos(self):
         """Get agent position from unwrapped env."""
         return self.unwrapped.agent_pos
 
-    def _get_goal_pos(self):
-        """Get goal position. In Empty env, goal is at (width-2, height-2)."""
-        if self.goal_pos is None:
-            grid = self.unwrapped.grid
-            for i in range(grid.width):
-                for j in range(grid.height):
-                    cell = grid.get(i, j)
-                    if cell is not None and cell.type == "goal":
-                        self.goal_pos = np.array([i, j])
-                        self.max_distance = (grid.width - 2) + (grid.height - 2)
-                        return self.goal_pos
-            # Fallback: bottom-right corner
-            self.goal_pos = np.array([grid.width - 2, grid.height - 2])
-            self.max_distance = (grid.width - 2) + (grid.height - 2)
-        return self.goal_pos
-
     def _potential(self, agent_pos):
         """Compute potential: higher when closer to goal."""
-        goal = self._get_goal_pos()
-        dist = abs(agent_pos[0] - goal[0]) + abs(agent_pos[1] - goal[1])
-        return self.scale * (1.0 - dist / max(self.max_distance, 1))
+        return self.scale * float(self.distance_map.potential(agent_pos))
 
     def reset(self, **kwargs):
         obs, info = self.env.reset(**kwargs)
-        self.goal_pos = None  # Reset goal cache
+        # The layout may change on every reset (e.g. randomized envs)
+        self.distance_map = DISTANCE_MAPS.get(self.unwrapped.grid)
         self.prev_potential = self._potential(self._get_agent_pos())
         return obs, info
 
@@ -74,21 +65,25 @@ class RewardShapingWrapper(gym.Wrapper):
 
 
 class ObsPreprocessWrapper(gym.ObservationWrapper):
-    """Convert (H, W, C) uint8 image to (C, H, W) float32 normalized."""
+    """Convert (H, W, C) uint8 image to (C, H, W) uint8.
+
+    Normalization to [0, 1] is deferred to QNetwork.forward so that the
+    env loop and the replay buffer only ever handle uint8 observations.
+    """
 
     def __init__(self, env):
         super().__init__(env)
         old_space = env.observation_space
         self.observation_space = gym.spaces.Box(
-            low=0.0,
-            high=1.0,
+            low=0,
+            high=255,
             shape=(old_space.shape[2], old_space.shape[0], old_space.shape[1]),
-            dtype=np.float32,
+            dtype=np.uint8,
         )
 
     def observation(self, obs):
-        # (H, W, C) -> (C, H, W), normalize to [0, 1]
-        return np.transpose(obs, (2, 0, 1)).astype(np.float32) / 255.0
+        # (H, W, C) -> (C, H, W)
+        return np.ascontiguousarray(np.transpose(obs, (2, 0, 1)))
 
 
 def make_env(config, reward_shaping=False):
@@ -105,3 +100,44 @@ def make_env(config, reward_shaping=False):
 
     env = ObsPreprocessWrapper(env)  # Must be last: converts observation format
     return env
+
+
+def make_vec_env(config, reward_shaping=False, num_envs=None):
+    """Create a vector of wrapped MiniGrid environments.
+
+    Every sub-env is a full make_env stack, so reward shaping and
+    observation preprocessing run per sub-env. env.vector_mode selects
+    in-process stepping ("sync") or one worker process per sub-env
+    ("async"). Finished sub-envs are reset automatically by the vector env.
+
+    With env.backend set to "numpy", Empty-NxN envs are simulated by
+    BatchedEmptyEnv instead, which steps all sub-envs with array ops.
+    """
+    if num_envs is None:
+        num_envs = config["env"].get("num_envs", 1)
+    if config["env"].get("backend", "minigrid") == "numpy":
+        return BatchedEmptyEnv.from_config(config, num_envs, reward_shaping)
+    env_fns = [lambda: make_env(config, reward_shaping) for _ in range(num_envs)]
+    if config["env"].get("vector_mode", "sync") == "async":
+        return gym.vector.AsyncVectorEnv(env_fns)
+    return gym.vector.SyncVectorEnv(env_fns)
+
+
+def vec_env_state(envs):
+    """Picklable state of a vector env for resumable checkpoints.
+
+    Returns None for AsyncVectorEnv, whose sub-envs live in worker
+    processes and cannot be captured.
+    """
+    if isinstance(envs, BatchedEmptyEnv):
+        return envs
+    if isinstance(envs, gym.vector.SyncVectorEnv):
+        return envs.envs
+    return None
+
+
+def restore_vec_env(state):
+    """Rebuild a vector env from vec_env_state()."""
+    if isinstance(state, BatchedEmptyEnv):
+        return state
+    return gym.vector.SyncVectorEnv([lambda env=env: env for env in state])
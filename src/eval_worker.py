@@ -0,0 +1,167 @@
+"""Greedy evaluation of Q-network weights, optionally in a background process."""
+import queue
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from .batched_env import BatchedEmptyEnv
+from .env_utils import make_env
+from .network import QNetwork
+
+
+def run_greedy_episodes(q_network, config, num_episodes, num_envs=None, record_episodes=0):
+    """Play greedy episodes concurrently, without reward shaping.
+
+    Up to num_envs environments (default: one per episode) run at once.
+    Each step is a single batched forward pass over the environments still
+    playing, and an environment that finishes starts the next pending
+    episode. Frames are rendered for the first record_episodes episodes.
+    With env.backend "numpy" (and nothing to render) all environments are
+    stepped together by BatchedEmptyEnv.
+
+    Returns one dict (episode, reward, length, success, frames) per
+    episode, in episode order.
+    """
+    num_envs = min(num_envs or num_episodes, num_episodes)
+    batched = config["env"].get("backend", "minigrid") == "numpy" and not record_episodes
+    if batched:
+        vec_env = BatchedEmptyEnv.from_config(config, num_envs)
+        obs, _ = vec_env.reset()
+    else:
+        envs = [make_env(config, reward_shaping=False) for _ in range(num_envs)]
+        obs = np.stack([env.reset()[0] for env in envs])
+    device = next(q_network.parameters()).device
+
+    results = [None] * num_episodes
+    env_episode = np.arange(num_envs)  # episode each env is playing
+    next_episode = num_envs
+    rewards = np.zeros(num_envs)
+    lengths = np.zeros(num_envs, dtype=np.int64)
+    frames = [[] for _ in range(num_envs)]
+    active = np.ones(num_envs, dtype=bool)
+
+    while active.any():
+        playing = np.flatnonzero(active)
+        for i in playing:
+            if env_episode[i] < record_episodes:
+                frames[i].append(envs[i].unwrapped.get_frame())
+        with torch.no_grad():
+            actions = q_network(torch.as_tensor(obs[playing], device=device)).argmax(dim=1).cpu().numpy()
+
+        if batched:
+            # Finished envs keep stepping (and are reset automatically); ignore them
+            all_actions = np.zeros(num_envs, dtype=np.int64)
+            all_actions[playing] = actions
+            obs, step_rewards, terminated, truncated, _ = vec_env.step(all_actions)
+            steps = zip(playing, step_rewards[playing], terminated[playing], truncated[playing])
+        else:
+            steps = []
+            for i, action in zip(playing, actions):
+                obs[i], reward, done, cut, _ = envs[i].step(action)
+                steps.append((i, reward, done, cut))
+
+        for i, reward, done, cut in steps:
+            rewards[i] += reward
+            lengths[i] += 1
+            if not (done or cut):
+                continue
+
+            episode = env_episode[i]
+            results[episode] = {
+                "episode": int(episode),
+                "reward": float(rewards[i]),
+                "length": int(lengths[i]),
+                "success": bool(done and rewards[i] > 0),
+                "frames": frames[i] if episode < record_episodes else None,
+            }
+            if next_episode < num_episodes:
+                env_episode[i] = next_episode
+                next_episode += 1
+                if not batched:
+                    obs[i], _ = envs[i].reset()
+                rewards[i] = 0
+                lengths[i] = 0
+                frames[i] = []
+            else:
+                active[i] = False
+
+    if batched:
+        vec_env.close()
+    else:
+        for env in envs:
+            env.close()
+    return results
+
+
+def evaluate_network(q_network, config, num_episodes=20):
+    """Greedy evaluation without reward shaping; returns (success_rate, avg_reward)."""
+    results = run_greedy_episodes(q_network, config, num_episodes)
+    successes = sum(r["success"] for r in results)
+    return successes / num_episodes, np.mean([r["reward"] for r in results])
+
+
+def run_eval_worker(config, obs_shape, n_actions, num_episodes, requests, results):
+    """Worker process: evaluate (episode, total_steps, weights) requests until None arrives."""
+    torch.set_num_threads(1)
+    network = QNetwork(obs_shape, n_actions)
+    network.eval()
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        episode, total_steps, weights = request
+        network.load_state_dict({name: torch.from_numpy(array) for name, array in weights.items()})
+        success_rate, avg_reward = evaluate_network(network, config, num_episodes)
+        results.put((episode, total_steps, success_rate, avg_reward))
+
+
+class EvalWorker:
+    """Evaluates Q-network snapshots in a separate process.
+
+    submit() hands over a copy of the weights and returns immediately;
+    results come back from poll() tagged with the episode and env step of
+    the snapshot.
+    """
+
+    def __init__(self, config, obs_shape, n_actions, num_episodes):
+        ctx = mp.get_context("spawn")
+        self.requests = ctx.Queue()
+        self.results = ctx.Queue()
+        self.pending = 0
+        self.process = ctx.Process(
+            target=run_eval_worker,
+            args=(config, obs_shape, n_actions, num_episodes, self.requests, self.results),
+            daemon=True,
+        )
+        self.process.start()
+
+    def submit(self, episode, total_steps, q_network):
+        weights = {name: tensor.detach().cpu().numpy().copy() for name, tensor in q_network.state_dict().items()}
+        self.requests.put((episode, total_steps, weights))
+        self.pending += 1
+
+    def poll(self, wait=False):
+        """Finished (episode, total_steps, success_rate, avg_reward) results.
+
+        With wait, blocks until every submitted snapshot is evaluated.
+        """
+        finished = []
+        while self.pending:
+            try:
+                result = self.results.get(timeout=1.0) if wait else self.results.get_nowait()
+            except queue.Empty:
+                if self.process.exitcode is not None:
+                    raise RuntimeError(f"Eval worker exited with code {self.process.exitcode}")
+                if not wait:
+                    break
+                continue
+            finished.append(result)
+            self.pending -= 1
+        return finished
+
+    def close(self):
+        """Wait for pending evaluations, stop the worker and return their results."""
+        finished = self.poll(wait=True)
+        self.requests.put(None)
+        self.process.join()
+        return finished
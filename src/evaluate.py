@@ -1,8 +1,13 @@
 """Evaluation script: load trained models and evaluate."""
 import sys
+import os
 import argparse
 import csv
+import json
 import random
+import hashlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 import torch
 from pathlib import Path
@@ -11,46 +16,175 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from src.config import load_config
 from src.env_utils import make_env
-from src.dqn_agent import DQNAgent
+from src.checkpoint import MANIFEST_SUFFIX, find_checkpoint, load_checkpoint, read_manifest
+from src.eval_worker import run_greedy_episodes
+from src.network import QNetwork
 
+EVAL_SEED = 42
 
-def evaluate_model(model_path, config, num_episodes=100, record_episodes=False):
-    """Evaluate a trained model."""
+
+def evaluate_model(model_path, config, num_episodes=100, record_episodes=False, num_envs=None):
+    """Evaluate a trained model.
+
+    All episodes run concurrently (at most num_envs at a time) with one
+    batched greedy forward pass per step; see run_greedy_episodes. Only
+    the checkpoint's Q-network weights are loaded.
+    """
     env = make_env(config, reward_shaping=False)
     obs_shape = env.observation_space.shape
     n_actions = env.action_space.n
+    env.close()
 
-    agent = DQNAgent(obs_shape, n_actions, config)
-    agent.load(model_path)
-
-    results = []
-    for ep in range(num_episodes):
-        obs, _ = env.reset()
-        episode_reward = 0
-        episode_length = 0
-        done = False
-        frames = []
-
-        while not done:
-            if record_episodes and ep < 5:
-                frames.append(env.unwrapped.get_frame())
-            action = agent.select_action(obs, evaluate=True)
-            obs, reward, terminated, truncated, info = env.step(action)
-            episode_reward += reward
-            episode_length += 1
-            done = terminated or truncated
-
-        success = terminated and episode_reward > 0
-        results.append({
-            "episode": ep,
-            "reward": episode_reward,
-            "length": episode_length,
-            "success": success,
-            "frames": frames if record_episodes and ep < 5 else None,
-        })
+    q_network = QNetwork(obs_shape, n_actions)
+    q_network.load_state_dict(load_checkpoint(model_path, parts=("q_network",), map_location="cpu")["q_network"])
+    q_network.eval()
+
+    return run_greedy_episodes(q_network, config, num_episodes, num_envs,
+                               record_episodes=5 if record_episodes else 0)
+
+
+def experiment_config(exp_dir, project_root):
+    """Config of an experiment, picked from its directory name."""
+    # Determine config based on experiment name
+    exp_name = exp_dir.name
+    if "ablation_no_target" in exp_name:
+        config_name = "ablation_no_target.yaml"
+    elif "ablation_gamma" in exp_name:
+        config_name = "ablation_gamma.yaml"
+    elif "reward_shaping" in exp_name:
+        config_name = "reward_shaping.yaml"
+    else:
+        config_name = "default.yaml"
+
+    config_path = project_root / "configs" / config_name
+    config = load_config(config_path)
+
+    # Extract seed and gamma from directory name
+    if "seed" in exp_name:
+        seed_str = exp_name.split("seed")[-1].split("_")[0]
+        try:
+            config["seed"] = int(seed_str)
+        except ValueError:
+            pass
+
+    if "gamma" in exp_name:
+        parts = exp_name.split("gamma")
+        if len(parts) > 1:
+            gamma_str = parts[-1].split("_seed")[0]
+            try:
+                config["agent"]["gamma"] = float(gamma_str)
+            except ValueError:
+                pass
+    return config
+
+
+def write_eval_results(exp_dir, results):
+    """Save per-experiment results to eval_results.csv."""
+    eval_csv = exp_dir / "eval_results.csv"
+    with open(eval_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["episode", "reward", "length", "success"])
+        writer.writeheader()
+        for r in results:
+            writer.writerow({
+                "episode": r["episode"],
+                "reward": r["reward"],
+                "length": r["length"],
+                "success": r["success"],
+            })
+
+
+def evaluate_experiment(exp_dir, config, num_episodes, record=False, num_envs=None):
+    """Evaluate one experiment's final model and write its eval_results.csv.
+
+    Returns the per-episode results (without frames, which go to frames/).
+    """
+    random.seed(EVAL_SEED)
+    np.random.seed(EVAL_SEED)
+    torch.manual_seed(EVAL_SEED)
+
+    results = evaluate_model(find_checkpoint(exp_dir, "final_model"), config, num_episodes, record, num_envs)
+    write_eval_results(exp_dir, results)
+
+    # Save frames for GIF generation
+    if record:
+        frames_dir = exp_dir / "frames"
+        frames_dir.mkdir(exist_ok=True)
+        for r in results:
+            if r["frames"]:
+                np.save(frames_dir / f"ep{r['episode']}_frames.npy", np.array(r["frames"]))
+
+    return [{k: v for k, v in r.items() if k != "frames"} for r in results]
 
-    env.close()
-    return results
+
+def summarize(exp_name, results):
+    """Summary row of one experiment's per-episode results."""
+    return {
+        "experiment": exp_name,
+        "success_rate": np.mean([r["success"] for r in results]),
+        "avg_reward": np.mean([r["reward"] for r in results]),
+        "std_reward": np.std([r["reward"] for r in results]),
+        "avg_length": np.mean([r["length"] for r in results]),
+    }
+
+
+class EvalCache:
+    """Per-episode evaluation results keyed by what determines them.
+
+    The key hashes the checkpoint bytes (for a CheckpointStore manifest:
+    the Q-network blob's hash), the resolved config, the episode count and
+    the evaluation seed, so an experiment is only re-evaluated
+    when one of them changed. Entries live in one JSON index; each
+    experiment keeps only its latest entry.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(model_path, config, num_episodes, seed=EVAL_SEED):
+        digest = hashlib.sha256()
+        if Path(model_path).suffix == MANIFEST_SUFFIX:
+            # Only the Q-network weights affect evaluation
+            digest.update(read_manifest(model_path)["blobs"]["q_network"].encode())
+        else:
+            with open(model_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        params = {"config": config, "num_episodes": num_episodes, "seed": seed}
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key, need_frames=False):
+        """Cached results for key, or None (also when frames are needed but were not saved)."""
+        entry = self.entries.get(key)
+        if entry is None or (need_frames and not entry["frames"]):
+            return None
+        return entry["results"]
+
+    def put(self, key, exp_name, results, frames=False):
+        self.entries = {k: e for k, e in self.entries.items() if e["experiment"] != exp_name}
+        self.entries[key] = {"experiment": exp_name, "frames": frames, "results": results}
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        tmp_path.replace(self.path)
+
+
+def print_experiment(summary):
+    print(f"  Success Rate: {summary['success_rate']:.2%}")
+    print(f"  Avg Reward:   {summary['avg_reward']:.4f} +/- {summary['std_reward']:.4f}")
+    print(f"  Avg Length:   {summary['avg_length']:.1f}")
+
+
+def init_worker(num_threads):
+    """Pool initializer: pin torch's thread count so workers don't oversubscribe."""
+    torch.set_num_threads(num_threads)
 
 
 def main():
@@ -58,6 +192,15 @@ def main():
     parser.add_argument("--results_dir", type=str, required=True, help="Path to results directory")
     parser.add_argument("--num_episodes", type=int, default=100, help="Number of eval episodes")
     parser.add_argument("--record", action="store_true", help="Record frames for GIF")
+    parser.add_argument("--num_envs", type=int, default=None,
+                        help="Episodes played concurrently (default: all of them)")
+    parser.add_argument("--backend", type=str, default=None, choices=["minigrid", "numpy"],
+                        help="Override env.backend (numpy: batched simulator for Empty-NxN, no --record)")
+    parser.add_argument("--workers", type=int, default=1, help="Experiments evaluated in parallel processes")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Torch threads per worker (default: CPU count / workers)")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-evaluate experiments whose cached results are still valid")
     args = parser.parse_args()
 
     results_dir = Path(args.results_dir)
@@ -76,88 +219,52 @@ def main():
     print(f"Found {len(experiments)} experiments")
     print("=" * 70)
 
+    cache = EvalCache(results_dir / "eval_cache.json")
+    jobs = []
     summary = []
     for exp_dir in experiments:
-        model_path = exp_dir / "final_model.pt"
-        if not model_path.exists():
-            print(f"  Skipping {exp_dir.name} (no final_model.pt)")
+        model_path = find_checkpoint(exp_dir, "final_model")
+        if model_path is None:
+            print(f"  Skipping {exp_dir.name} (no final_model checkpoint)")
             continue
+        config = experiment_config(exp_dir, project_root)
+        if args.backend is not None:
+            config["env"]["backend"] = args.backend
+        key = EvalCache.key(model_path, config, args.num_episodes)
+        cached = None if args.force else cache.get(key, need_frames=args.record)
+        if cached is not None and (not args.record or (exp_dir / "frames").exists()):
+            write_eval_results(exp_dir, cached)
+            summary.append(summarize(exp_dir.name, cached))
+            print(f"  Cached {exp_dir.name} (unchanged checkpoint and config)")
+            continue
+        jobs.append((exp_dir, config, key))
 
-        # Determine config based on experiment name
-        exp_name = exp_dir.name
-        if "ablation_no_target" in exp_name:
-            config_name = "ablation_no_target.yaml"
-        elif "ablation_gamma" in exp_name:
-            config_name = "ablation_gamma.yaml"
-        elif "reward_shaping" in exp_name:
-            config_name = "reward_shaping.yaml"
-        else:
-            config_name = "default.yaml"
-
-        config_path = project_root / "configs" / config_name
-        config = load_config(config_path)
-
-        # Extract seed and gamma from directory name
-        if "seed" in exp_name:
-            seed_str = exp_name.split("seed")[-1].split("_")[0]
-            try:
-                config["seed"] = int(seed_str)
-            except ValueError:
-                pass
+    def finish(exp_dir, key, results):
+        cache.put(key, exp_dir.name, results, frames=args.record)
+        cache.save()
+        summary.append(summarize(exp_dir.name, results))
+        print_experiment(summary[-1])
 
-        if "gamma" in exp_name:
-            parts = exp_name.split("gamma")
-            if len(parts) > 1:
-                gamma_str = parts[-1].split("_seed")[0]
-                try:
-                    config["agent"]["gamma"] = float(gamma_str)
-                except ValueError:
-                    pass
-
-        random.seed(42)
-        np.random.seed(42)
-        torch.manual_seed(42)
-
-        print(f"\nEvaluating: {exp_name}")
-        results = evaluate_model(model_path, config, args.num_episodes, args.record)
-
-        success_rate = np.mean([r["success"] for r in results])
-        avg_reward = np.mean([r["reward"] for r in results])
-        avg_length = np.mean([r["length"] for r in results])
-        std_reward = np.std([r["reward"] for r in results])
-
-        print(f"  Success Rate: {success_rate:.2%}")
-        print(f"  Avg Reward:   {avg_reward:.4f} +/- {std_reward:.4f}")
-        print(f"  Avg Length:   {avg_length:.1f}")
-
-        summary.append({
-            "experiment": exp_name,
-            "success_rate": success_rate,
-            "avg_reward": avg_reward,
-            "std_reward": std_reward,
-            "avg_length": avg_length,
-        })
-
-        # Save per-experiment results
-        eval_csv = exp_dir / "eval_results.csv"
-        with open(eval_csv, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=["episode", "reward", "length", "success"])
-            writer.writeheader()
-            for r in results:
-                writer.writerow({
-                    "episode": r["episode"],
-                    "reward": r["reward"],
-                    "length": r["length"],
-                    "success": r["success"],
-                })
-
-        # Save frames for GIF generation
-        if args.record:
-            frames_dir = exp_dir / "frames"
-            frames_dir.mkdir(exist_ok=True)
-            for r in results:
-                if r["frames"]:
-                    np.save(frames_dir / f"ep{r['episode']}_frames.npy", np.array(r["frames"]))
+    eval_args = (args.num_episodes, args.record, args.num_envs)
+    if args.workers > 1 and jobs:
+        threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+        with ProcessPoolExecutor(args.workers, mp_context=mp.get_context("spawn"),
+                                 initializer=init_worker, initargs=(threads,)) as pool:
+            futures = {pool.submit(evaluate_experiment, exp_dir, config, *eval_args): (exp_dir, key)
+                       for exp_dir, config, key in jobs}
+            # Each worker has written its eval_results.csv by the time it completes
+            for future in as_completed(futures):
+                exp_dir, key = futures[future]
+                print(f"\nEvaluated: {exp_dir.name}")
+                finish(exp_dir, key, future.result())
+    else:
+        if args.threads is not None:
+            torch.set_num_threads(args.threads)
+        for exp_dir, config, key in jobs:
+            print(f"\nEvaluating: {exp_dir.name}")
+            finish(exp_dir, key, evaluate_experiment(exp_dir, config, *eval_args))
+    # Deterministic order regardless of caching and completion order
+    summary.sort(key=lambda s: s["experiment"])
 
     # Print summary table
     print("\n" + "=" * 70)
@@ -0,0 +1,203 @@
+"""Buffered training log: episode records are written by a background thread."""
+import csv
+import time
+import queue
+import threading
+import numpy as np
+
+# One record per finished episode; eval columns are NaN when no evaluation ran
+RECORD_DTYPE = np.dtype([
+    ("episode", np.int64),
+    ("steps", np.int64),
+    ("epsilon", np.float64),
+    ("episode_reward", np.float64),
+    ("episode_length", np.int64),
+    ("loss", np.float64),
+    ("eval_success_rate", np.float64),
+    ("eval_avg_reward", np.float64),
+    ("shaped_reward", np.float64),
+])
+CSV_COLUMNS = [
+    "episode", "steps", "epsilon", "episode_reward",
+    "episode_length", "loss", "eval_success_rate", "eval_avg_reward",
+]
+
+
+def read_records(path):
+    """Episode records of a <name>.records file (a run still in progress)."""
+    return np.fromfile(path, dtype=RECORD_DTYPE)
+
+
+class NullSummaryWriter:
+    """TensorBoard sink that drops everything (training.tensorboard: false)."""
+
+    def add_scalar(self, *args, **kwargs):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BufferedLogWriter:
+    """Collects episode records in memory and writes them off the env loop.
+
+    Records go into a preallocated ring of flush_every entries. When the
+    ring is full, or flush_secs have passed, its contents are handed to a
+    writer thread. That thread appends them to the CSV, emits the
+    TensorBoard scalars and, with npz_path, appends them to a raw
+    training_log.records file (see read_records), so a flush costs the same
+    however long the run is. close() turns that file into the columnar
+    .npz (one array per field). Other file work can be queued with
+    submit() so it happens in order with the records. A job that fails
+    does not stop the thread; its error is raised by the next submit(),
+    flush() or close().
+
+    resume_rows truncates the records (or a finished run's .npz) to the
+    rows kept on resume.
+    """
+
+    def __init__(self, csv_path, tb_writer, npz_path=None, flush_every=50, flush_secs=10.0,
+                 log_shaped=False, resume_rows=None):
+        self.tb_writer = tb_writer
+        self.npz_path = npz_path
+        self.flush_secs = flush_secs
+        self.log_shaped = log_shaped
+        self.ring = np.zeros(flush_every, dtype=RECORD_DTYPE)
+        self.count = 0
+        self.rows_written = 0
+        self.last_flush = time.monotonic()
+
+        self.records_file = None
+        if npz_path is not None:
+            self.records_path = npz_path.with_suffix(".records")
+            self.records_file = self._open_records(resume_rows)
+        self.rows_written = resume_rows or 0
+
+        self.csv_file = open(csv_path, "a", newline="")
+        self.csv_writer = csv.writer(self.csv_file)
+        self.error = None
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def append(self, episode, steps, epsilon, episode_reward, episode_length, loss,
+               eval_sr=None, eval_ar=None, shaped_reward=np.nan):
+        record = self.ring[self.count]
+        record["episode"] = episode
+        record["steps"] = steps
+        record["epsilon"] = epsilon
+        record["episode_reward"] = episode_reward
+        record["episode_length"] = episode_length
+        record["loss"] = loss
+        record["eval_success_rate"] = np.nan if eval_sr is None else eval_sr
+        record["eval_avg_reward"] = np.nan if eval_ar is None else eval_ar
+        record["shaped_reward"] = shaped_reward
+        self.count += 1
+        if self.count == len(self.ring) or time.monotonic() - self.last_flush >= self.flush_secs:
+            self.flush()
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the writer thread, after the records queued so far."""
+        self.flush()
+        self._raise_error()
+        self.jobs.put((fn, args))
+
+    def flush(self, wait=False):
+        """Hand buffered records to the writer thread; with wait, block until written."""
+        self._raise_error()
+        if self.count:
+            self.jobs.put((self._write_records, (self.ring[:self.count].copy(),)))
+            self.rows_written += self.count
+            self.count = 0
+        self.last_flush = time.monotonic()
+        if wait:
+            self.jobs.join()
+            self._raise_error()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.jobs.put(None)
+            self.thread.join()
+            self.csv_file.close()
+            self.tb_writer.close()
+            if self.records_file is not None:
+                self.records_file.close()
+        self._raise_error()
+        if self.records_file is not None:
+            self._write_npz()
+
+    def _open_records(self, resume_rows):
+        """Open the records file for appending, keeping resume_rows rows."""
+        if resume_rows is None:
+            return open(self.records_path, "wb")
+        if not self.records_path.exists() and self.npz_path.exists():
+            # Resuming from a run that was closed: start from its .npz
+            with np.load(self.npz_path) as data:
+                old = np.zeros(len(data["episode"]), dtype=RECORD_DTYPE)
+                for name in RECORD_DTYPE.names:
+                    old[name] = data[name]
+            old.tofile(self.records_path)
+        records_file = open(self.records_path, "ab")
+        records_file.truncate(resume_rows * RECORD_DTYPE.itemsize)
+        return records_file
+
+    def _write_npz(self):
+        table = read_records(self.records_path)
+        tmp_path = self.npz_path.with_name(self.npz_path.stem + ".tmp.npz")
+        np.savez(tmp_path, **{name: table[name] for name in RECORD_DTYPE.names})
+        tmp_path.replace(self.npz_path)
+        self.records_path.unlink()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("Writing the training log failed") from error
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                fn, args = job
+                fn(*args)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.jobs.task_done()
+
+    def _write_records(self, records):
+        rows = []
+        for r in records:
+            evaluated = not np.isnan(r["eval_success_rate"])
+            rows.append([
+                int(r["episode"]), int(r["steps"]), f"{r['epsilon']:.4f}",
+                f"{r['episode_reward']:.4f}", int(r["episode_length"]),
+                f"{r['loss']:.6f}",
+                f"{r['eval_success_rate']:.4f}" if evaluated else "",
+                f"{r['eval_avg_reward']:.4f}" if evaluated else "",
+            ])
+        self.csv_writer.writerows(rows)
+        self.csv_file.flush()
+
+        writer = self.tb_writer
+        for r in records:
+            episode = int(r["episode"])
+            writer.add_scalar("train/episode_reward", r["episode_reward"], episode)
+            writer.add_scalar("train/episode_length", r["episode_length"], episode)
+            writer.add_scalar("train/epsilon", r["epsilon"], episode)
+            writer.add_scalar("train/loss", r["loss"], episode)
+            if self.log_shaped:
+                writer.add_scalar("train/shaped_reward", r["shaped_reward"], episode)
+            if not np.isnan(r["eval_success_rate"]):
+                writer.add_scalar("eval/success_rate", r["eval_success_rate"], episode)
+                writer.add_scalar("eval/avg_reward", r["eval_avg_reward"], episode)
+
+        if self.records_file is not None:
+            self.records_file.write(records.tobytes())
+            self.records_file.flush()
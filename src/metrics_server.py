@@ -0,0 +1,143 @@
+"""Prometheus-format metrics of a running training job, served over HTTP."""
+import math
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def resident_memory_bytes():
+    """Current RSS of this process (peak RSS where /proc is unavailable, else NaN)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        pass
+    try:
+        import resource  # POSIX only
+    except ImportError:
+        return math.nan
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class TrainingMetrics:
+    """Counters of a training run, read by MetricsServer on every scrape.
+
+    The training loop calls observe() once per iteration; it only assigns
+    attributes, so it costs next to nothing. Rates are computed at scrape
+    time over the last rate_window seconds of scrapes (since the first
+    observe() for the first one, so resumed runs start from their counts).
+    """
+
+    def __init__(self, experiment, replay_capacity, rate_window=30.0):
+        self.experiment = experiment
+        self.replay_capacity = replay_capacity
+        self.rate_window = rate_window
+        self.start_time = time.monotonic()
+        self.episode = 0
+        self.total_steps = 0
+        self.num_updates = 0
+        self.epsilon = 0.0
+        self.replay_size = 0
+        self.eval_success_rate = math.nan
+        self.last_progress = self.start_time
+        self.lock = threading.Lock()
+        # (time, env steps, updates) at the first observe() and previous scrapes
+        self.samples = deque()
+
+    def observe(self, episode, total_steps, num_updates, epsilon, replay_size):
+        if not self.samples:
+            self.samples.append((time.monotonic(), total_steps, num_updates))
+        if total_steps != self.total_steps or num_updates != self.num_updates:
+            self.last_progress = time.monotonic()
+        self.episode = episode
+        self.total_steps = total_steps
+        self.num_updates = num_updates
+        self.epsilon = epsilon
+        self.replay_size = replay_size
+
+    def _rates(self, now, total_steps, num_updates):
+        with self.lock:
+            if not self.samples:
+                return 0.0, 0.0
+            while len(self.samples) > 1 and now - self.samples[1][0] >= self.rate_window:
+                self.samples.popleft()
+            then, old_steps, old_updates = self.samples[0]
+            self.samples.append((now, total_steps, num_updates))
+        elapsed = max(now - then, 1e-9)
+        return (total_steps - old_steps) / elapsed, (num_updates - old_updates) / elapsed
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        now = time.monotonic()
+        total_steps, num_updates = self.total_steps, self.num_updates
+        steps_per_sec, updates_per_sec = self._rates(now, total_steps, num_updates)
+        metrics = [
+            ("dqn_episodes_total", "counter", "Finished training episodes.", self.episode),
+            ("dqn_env_steps_total", "counter", "Environment steps taken.", total_steps),
+            ("dqn_updates_total", "counter", "Learner gradient updates.", num_updates),
+            ("dqn_epsilon", "gauge", "Current exploration rate.", self.epsilon),
+            ("dqn_env_steps_per_second", "gauge", "Env step rate over the last scrapes.", steps_per_sec),
+            ("dqn_updates_per_second", "gauge", "Update rate over the last scrapes.", updates_per_sec),
+            ("dqn_replay_size", "gauge", "Transitions in the replay buffer.", self.replay_size),
+            ("dqn_replay_capacity", "gauge", "Replay buffer capacity.", self.replay_capacity),
+            ("dqn_replay_fill_ratio", "gauge", "Replay size over capacity.", self.replay_size / self.replay_capacity),
+            ("dqn_eval_success_rate", "gauge", "Success rate of the latest evaluation.", self.eval_success_rate),
+            ("dqn_seconds_since_progress", "gauge", "Seconds since the env step or update count changed.",
+             now - self.last_progress),
+            ("dqn_uptime_seconds", "gauge", "Seconds since the run started.", now - self.start_time),
+            ("process_resident_memory_bytes", "gauge", "Resident memory of the learner process.",
+             resident_memory_bytes()),
+        ]
+        label = f'{{experiment="{self.experiment}"}}'
+        lines = []
+        for name, kind, help_text, value in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{label} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def format_value(value):
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsServer:
+    """Serves TrainingMetrics.render() at /metrics from a daemon thread.
+
+    Port 0 picks a free port; the one in use is in `port` and `url`.
+    """
+
+    def __init__(self, metrics, port=0, host="127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of the training output
+
+        self.metrics = metrics
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = f"http://{host}:{self.port}/metrics"
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
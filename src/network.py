@@ -6,6 +6,8 @@ import torch.nn as nn
 class QNetwork(nn.Module):
     """CNN-based Q-Network for MiniGrid observations.
 
+    Observations are accepted as uint8 and scaled to [0, 1] in forward.
+
     Architecture:
         Input (3, 7, 7)
         -> Conv2d(3, 16, k=2) -> ReLU -> (16, 6, 6)
@@ -42,6 +44,7 @@ class QNetwork(nn.Module):
         )
 
     def forward(self, x):
+        x = x.float() / 255.0
         x = self.conv(x)
         x = x.view(x.size(0), -1)
         return self.fc(x)
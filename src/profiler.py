@@ -0,0 +1,181 @@
+"""Opt-in timing of the training loop's hot-path phases."""
+import json
+import time
+
+from torch.profiler import ProfilerActivity, profile, record_function
+
+# Histogram buckets are powers of two in nanoseconds: bucket b holds
+# durations in [2 ** (b - 1), 2 ** b)
+NUM_BUCKETS = 64
+
+
+class PhaseStats:
+    """Count, total, min/max and log2 histogram of one phase's durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.buckets = [0] * NUM_BUCKETS
+
+    def add(self, ns):
+        self.count += 1
+        self.total_ns += ns
+        if self.min_ns is None or ns < self.min_ns:
+            self.min_ns = ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        self.buckets[min(ns.bit_length(), NUM_BUCKETS - 1)] += 1
+
+    def percentile(self, q):
+        """Upper bound (ns) of the histogram bucket holding the q-quantile."""
+        rank = q * self.count
+        seen = 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(2 ** bucket, self.max_ns)
+        return self.max_ns
+
+    def to_dict(self, wall_ns):
+        return {
+            "count": self.count,
+            "total_s": self.total_ns / 1e9,
+            "share": self.total_ns / wall_ns if wall_ns else 0.0,
+            "mean_us": self.total_ns / self.count / 1e3 if self.count else 0.0,
+            "min_us": (self.min_ns or 0) / 1e3,
+            "max_us": self.max_ns / 1e3,
+            "p50_us": self.percentile(0.5) / 1e3,
+            "p90_us": self.percentile(0.9) / 1e3,
+            "p99_us": self.percentile(0.99) / 1e3,
+            "histogram_ns": {str(2 ** b): n for b, n in enumerate(self.buckets) if n},
+        }
+
+
+class _Phase:
+    """Reusable context manager timing one phase (not re-entrant)."""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.stats = PhaseStats()
+        self.start = 0
+        self.trace_range = None
+
+    def __enter__(self):
+        if self.profiler.tracing:
+            self.trace_range = record_function(self.name)
+            self.trace_range.__enter__()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add(time.perf_counter_ns() - self.start)
+        if self.trace_range is not None:
+            self.trace_range.__exit__(*exc)
+            self.trace_range = None
+        return False
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullProfiler:
+    """Profiler stand-in used when training.profile is off."""
+
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def step(self):
+        pass
+
+    def close(self, output_dir):
+        pass
+
+
+class Profiler:
+    """Per-phase wall-clock timings of the training loop.
+
+    Code under test is wrapped in `with profiler.phase(name):`. Durations
+    come from time.perf_counter_ns and go into per-phase counters and log2
+    histograms, so the cost per phase is two clock reads and a few integer
+    operations. close() writes them to profile.json.
+
+    step() marks one iteration of the training loop. With trace_start set,
+    iterations [trace_start, trace_start + trace_steps) are also recorded by
+    torch.profiler, with each phase as a labelled range, and exported as a
+    Chrome trace (trace.json, open in chrome://tracing or Perfetto).
+    """
+
+    def __init__(self, trace_start=None, trace_steps=20):
+        self.phases = {}
+        self.iteration = 0
+        self.trace_start = trace_start
+        self.trace_steps = trace_steps
+        self.trace = None
+        self.tracing = False
+        self.start_ns = time.perf_counter_ns()
+
+    def phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self, name)
+        return phase
+
+    def step(self):
+        """Advance the loop counter, starting or stopping the trace window."""
+        if self.trace_start is not None:
+            if self.iteration == self.trace_start:
+                self.trace = profile(activities=[ProfilerActivity.CPU])
+                self.trace.start()
+                self.tracing = True
+            elif self.tracing and self.iteration >= self.trace_start + self.trace_steps:
+                self._stop_trace()
+        self.iteration += 1
+
+    def _stop_trace(self):
+        self.trace.stop()
+        self.tracing = False
+
+    def summary(self):
+        wall_ns = time.perf_counter_ns() - self.start_ns
+        return {
+            "wall_time_s": wall_ns / 1e9,
+            "iterations": self.iteration,
+            "phases": {name: phase.stats.to_dict(wall_ns) for name, phase in self.phases.items()},
+        }
+
+    def close(self, output_dir):
+        """Write profile.json (and trace.json) to output_dir and print a table."""
+        if self.trace is not None:
+            if self.tracing:
+                self._stop_trace()
+            self.trace.export_chrome_trace(str(output_dir / "trace.json"))
+            self.trace = None
+
+        summary = self.summary()
+        with open(output_dir / "profile.json", "w") as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"\n--- Profile ({summary['iterations']} loop iterations, {summary['wall_time_s']:.1f}s) ---")
+        print(f"{'phase':<16}{'count':>10}{'total s':>10}{'share':>8}{'mean us':>10}{'p99 us':>10}")
+        phases = sorted(summary["phases"].items(), key=lambda item: -item[1]["total_s"])
+        for name, stats in phases:
+            print(f"{name:<16}{stats['count']:>10}{stats['total_s']:>10.2f}{stats['share']:>8.1%}"
+                  f"{stats['mean_us']:>10.1f}{stats['p99_us']:>10.1f}")
+
+
+def make_profiler(config):
+    """Profiler if training.profile is set, else a no-op NullProfiler."""
+    training = config["training"]
+    if not training.get("profile", False):
+        return NullProfiler()
+    return Profiler(training.get("profile_trace_start"), training.get("profile_trace_steps", 20))
@@ -1,36 +1,550 @@
 """Experience Replay Buffer."""
-import random
+from collections import deque, namedtuple
+from pathlib import Path
+
 import numpy as np
+import torch
+
+
+# Bytes copied at a time when streaming memory-mapped replay to or from disk
+COPY_CHUNK_BYTES = 64 * 2 ** 20
+
+# weights and indices are only filled in by prioritized buffers
+Batch = namedtuple(
+    "Batch",
+    ["states", "actions", "rewards", "next_states", "dones", "discounts", "weights", "indices"],
+    defaults=(None, None),
+)
+
+
+def copy_rows(dst, src):
+    """dst[:len(src)] = src, one chunk of rows at a time.
+
+    Memory-mapped sources and destinations are streamed through the page
+    cache instead of being read into RAM as a whole.
+    """
+    n = len(src)
+    if n == 0:
+        return
+    step = max(1, COPY_CHUNK_BYTES // max(src[:1].nbytes, 1))
+    for start in range(0, n, step):
+        dst[start:start + step] = src[start:start + step]
 
 
 class ReplayBuffer:
-    """Fixed-size circular replay buffer for DQN."""
+    """Fixed-size circular replay buffer for DQN.
 
-    def __init__(self, capacity):
+    Transitions are stored in preallocated arrays (one per field) that are
+    written in place, so the memory footprint is fixed at construction time
+    and sampling is a single fancy-indexing gather per field.
+
+    If `storage_dir` is given, each field is a memory-mapped .npy file in
+    that directory, so the OS pages storage in and out on demand. The
+    files are recreated empty on construction; contents survive a restart
+    only through save() and load() (resume snapshots).
+    """
+
+    _fields = ("states", "actions", "rewards", "next_states", "dones", "discounts")
+
+    def __init__(self, capacity, obs_shape, obs_dtype=np.uint8, storage_dir=None):
         self.capacity = capacity
-        self.buffer = []
+        self.obs_shape = tuple(obs_shape)
+        self.obs_dtype = np.dtype(obs_dtype)
         self.position = 0
+        self.size = 0
+        self.storage_dir = Path(storage_dir) if storage_dir is not None else None
+        if self.storage_dir is not None:
+            self.storage_dir.mkdir(parents=True, exist_ok=True)
 
-    def push(self, state, action, reward, next_state, done):
-        """Store a transition."""
-        transition = (state, action, reward, next_state, done)
-        if len(self.buffer) < self.capacity:
-            self.buffer.append(transition)
-        else:
-            self.buffer[self.position] = transition
+        self.states = self._allocate("states", self.obs_shape, self.obs_dtype)
+        self.actions = self._allocate("actions", (), np.int64)
+        self.rewards = self._allocate("rewards", (), np.float32)
+        self.dones = self._allocate("dones", (), np.float32)
+        self.discounts = self._allocate("discounts", (), np.float32)
+        if "next_states" in self._fields:
+            self.next_states = self._allocate("next_states", self.obs_shape, self.obs_dtype)
+
+    def _allocate(self, name, shape, dtype):
+        """Allocate storage for one field across the whole capacity."""
+        if self.storage_dir is None:
+            return np.zeros((self.capacity, *shape), dtype=dtype)
+        return np.lib.format.open_memmap(
+            self.storage_dir / f"{name}.npy", mode="w+", dtype=dtype, shape=(self.capacity, *shape)
+        )
+
+    def _advance(self):
+        """Move the write cursor forward by one transition."""
         self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def push(self, state, action, reward, next_state, done, discount):
+        """Store a transition.
+
+        `discount` multiplies the bootstrapped value of next_state in the TD
+        target: gamma for a 1-step transition, gamma ** n for an n-step one.
+        """
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.discounts[i] = discount
+        self._advance()
 
     def sample(self, batch_size):
         """Sample a random batch of transitions."""
-        batch = random.sample(self.buffer, batch_size)
-        states, actions, rewards, next_states, dones = zip(*batch)
-        return (
-            np.array(states),
-            np.array(actions),
-            np.array(rewards, dtype=np.float32),
-            np.array(next_states),
-            np.array(dones, dtype=np.float32),
+        return self._gather(self._sample_indices(batch_size))
+
+    def _sample_indices(self, batch_size):
+        """Draw uniform indices over the stored transitions.
+
+        Indices are sorted so gathers walk the storage front to back, which
+        keeps memory-mapped reads sequential within the page cache.
+        """
+        return np.sort(np.random.randint(0, self.size, size=batch_size))
+
+    def _gather(self, indices):
+        """Read the transitions at `indices` into a Batch."""
+        return Batch(
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices],
+            self.discounts[indices],
         )
 
+    def flush(self):
+        """Write memory-mapped storage back to disk (no-op in memory)."""
+        if self.storage_dir is None:
+            return
+        for name in self._fields:
+            getattr(self, name).flush()
+
+    @property
+    def nbytes(self):
+        """Total bytes held by the preallocated storage."""
+        return sum(getattr(self, name).nbytes for name in self._fields)
+
+    def state_dict(self):
+        """Cursor and stored transitions as plain arrays.
+
+        Only the filled slots are included (plus any after them that may
+        hold a pending next state). Memory-mapped contents are copied too:
+        the files keep changing after a snapshot, so they cannot stand in
+        for it.
+        """
+        state = {"position": self.position, "size": self.size}
+        n = min(self.size + self._lookahead, self.capacity)
+        for name in self._fields:
+            state[name] = getattr(self, name)[:n]
+        return state
+
+    def load_state_dict(self, state):
+        """Restore a buffer saved with state_dict()."""
+        for name in self._fields:
+            if name in state:
+                copy_rows(getattr(self, name), state[name])
+        self.position = int(state["position"])
+        self.size = int(state["size"])
+
+    def save(self, path):
+        """Write state_dict() to `path`.
+
+        In-memory buffers go to a compressed <path>.npz. Memory-mapped ones
+        go to a directory of uncompressed per-field .npy files plus
+        state.npz for the rest, copied in chunks so a buffer larger than
+        RAM is never read in whole.
+        """
+        path = Path(path)
+        state = self.state_dict()
+        if self.storage_dir is None:
+            np.savez_compressed(path.with_suffix(".npz"), **state)
+            return
+        path.mkdir()
+        for name in self._fields:
+            values = state.pop(name)
+            out = np.lib.format.open_memmap(
+                path / f"{name}.npy", mode="w+", dtype=values.dtype, shape=values.shape
+            )
+            copy_rows(out, values)
+            out.flush()
+            del out
+        np.savez(path / "state.npz", **state)
+
+    def load(self, path):
+        """Restore a buffer written by save(), one field at a time."""
+        path = Path(path)
+        if path.is_dir():
+            with np.load(path / "state.npz") as data:
+                state = {name: data[name] for name in data.files}
+            for name in self._fields:
+                state[name] = np.load(path / f"{name}.npy", mmap_mode="r")
+            self.load_state_dict(state)
+            return
+        # NpzFile reads each field only when it is accessed
+        with np.load(path.with_suffix(".npz")) as data:
+            self.load_state_dict(data)
+
+    @property
+    def _lookahead(self):
+        """Slots past `size` that may already hold data."""
+        return 1
+
+    def __len__(self):
+        return self.size
+
+
+class FrameReplayBuffer(ReplayBuffer):
+    """Replay buffer that stores each observation only once.
+
+    Slot i holds the state of transition i. Transitions must be pushed in
+    episode order from a single environment, so for n-step transitions
+    the next state of transition i is the state of transition i + n_step.
+    Pushing writes next_state into that slot ahead of time so the newest
+    transitions are always complete.
+
+    Transitions with done=1 do not write their next state: it is masked
+    out of the TD target and never read, and the slots after them are
+    taken by the next episode. Once the writes ahead wrap around, the
+    n_step slots [position, position + n_step) hold next states of the
+    newest transitions next to the action, reward and done of old ones,
+    so they are excluded from sampling (and from len()).
+    """
+
+    _fields = ("states", "actions", "rewards", "dones", "discounts")
+
+    def __init__(self, capacity, obs_shape, obs_dtype=np.uint8, storage_dir=None, n_step=1):
+        self.n_step = n_step
+        super().__init__(capacity, obs_shape, obs_dtype, storage_dir)
+
+    def push(self, state, action, reward, next_state, done, discount):
+        """Store a transition."""
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self.discounts[i] = discount
+        if not done:
+            self.states[(i + self.n_step) % self.capacity] = next_state
+        self._advance()
+
+    @property
+    def _overwritten(self):
+        """Stored slots in [position, position + n_step) whose state was overwritten."""
+        return max(0, self.size + self.n_step - self.capacity)
+
+    def _sample_indices(self, batch_size):
+        """Draw uniform indices, skipping the slots holding the newest next states."""
+        if self._overwritten == 0:
+            return super()._sample_indices(batch_size)
+        # Valid slots run from position + n_step, wrapping around, up to position
+        start = (self.position + self.n_step) % self.capacity
+        offsets = np.random.randint(0, len(self), size=batch_size)
+        return np.sort((start + offsets) % self.capacity)
+
+    def _gather(self, indices):
+        """Read the transitions at `indices` into a Batch."""
+        next_indices = (indices + self.n_step) % self.capacity
+        return Batch(
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.states[next_indices],
+            self.dones[indices],
+            self.discounts[indices],
+        )
+
+    @property
+    def _lookahead(self):
+        return self.n_step
+
     def __len__(self):
-        return len(self.buffer)
+        return self.size - self._overwritten
+
+
+class NStepAccumulator:
+    """Builds n-step transitions on the way into a replay buffer.
+
+    Each pushed 1-step transition enters a deque of length n_step. Once
+    the deque is full, the oldest entry is emitted as
+    (s_t, a_t, R_t^(n), s_{t+n}, done=0, gamma ** n), where
+    R_t^(n) = sum_k gamma^k * r_{t+k}. When an episode ends, every pending
+    entry is emitted with done=1 and the return truncated at the end of
+    the episode. With n_step=1 this passes transitions straight through
+    with discount gamma.
+    """
+
+    def __init__(self, buffer, n_step, gamma):
+        self.buffer = buffer
+        self.n_step = n_step
+        self.gamma = gamma
+        self.powers = gamma ** np.arange(n_step + 1)
+        self.pending = deque(maxlen=n_step)
+        self.rewards = deque(maxlen=n_step)
+
+    def push(self, state, action, reward, next_state, done):
+        """Add a 1-step transition and emit any n-step transitions it completes."""
+        self.pending.append((state, action))
+        self.rewards.append(reward)
+        if done:
+            while self.pending:
+                self._emit(next_state, done)
+        elif len(self.pending) == self.n_step:
+            self._emit(next_state, done)
+
+    def state_dict(self):
+        """Entries of the episode in progress, for resumable checkpoints."""
+        return {"pending": list(self.pending), "rewards": list(self.rewards)}
+
+    def load_state_dict(self, state):
+        self.pending = deque(state["pending"], maxlen=self.n_step)
+        self.rewards = deque(state["rewards"], maxlen=self.n_step)
+
+    def _emit(self, next_state, done):
+        state, action = self.pending.popleft()
+        k = len(self.rewards)
+        ret = float(np.dot(self.powers[:k], self.rewards))
+        self.rewards.popleft()
+        self.buffer.push(state, action, ret, next_state, done, self.powers[k])
+
+
+class SumTree:
+    """Array-backed binary sum-tree over a fixed number of leaves.
+
+    Node 1 is the root and node k has children 2k and 2k + 1. Leaves live
+    at [n_leaves, 2 * n_leaves), where n_leaves is the capacity rounded up
+    to a power of two so every leaf sits at the same depth. Updates and
+    prefix-sum lookups are O(log N) and both are vectorized over a batch.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.n_leaves = 1 << max(int(capacity - 1).bit_length(), 0)
+        self.depth = self.n_leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.n_leaves, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        """Set leaf priorities and propagate the new sums to the root."""
+        nodes = np.asarray(indices, dtype=np.int64) + self.n_leaves
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def get(self, indices):
+        """Return the priorities stored at the given leaves."""
+        return self.tree[np.asarray(indices) + self.n_leaves]
+
+    def find(self, values):
+        """Return the leaf index whose prefix-sum interval contains each value."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values > left_sum
+            values -= np.where(go_right, left_sum, 0.0)
+            nodes = left + go_right
+        return np.minimum(nodes - self.n_leaves, self.capacity - 1)
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """Proportional prioritized experience replay (Schaul et al., 2016).
+
+    Transitions are sampled with probability p_i^alpha / sum_k p_k^alpha
+    from a SumTree. New transitions get the current maximum priority so
+    they are replayed at least once. Importance-sampling weights
+    (N * P(i))^-beta are normalized by the batch maximum, with beta
+    annealed linearly to 1 over `beta_anneal_steps` sample calls.
+    """
+
+    def __init__(self, capacity, obs_shape, obs_dtype=np.uint8, storage_dir=None,
+                 alpha=0.6, beta_start=0.4, beta_anneal_steps=100000, priority_eps=1e-6):
+        super().__init__(capacity, obs_shape, obs_dtype, storage_dir)
+        self.alpha = alpha
+        self.beta_start = beta_start
+        self.beta_anneal_steps = beta_anneal_steps
+        self.priority_eps = priority_eps
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0
+        self.sample_count = 0
+
+    @property
+    def beta(self):
+        progress = min(1.0, self.sample_count / max(self.beta_anneal_steps, 1))
+        return self.beta_start + (1.0 - self.beta_start) * progress
+
+    def push(self, state, action, reward, next_state, done, discount):
+        """Store a transition with maximum priority."""
+        i = self.position
+        super().push(state, action, reward, next_state, done, discount)
+        self.tree.update([i], self.max_priority ** self.alpha)
+
+    def sample(self, batch_size):
+        """Sample a prioritized batch with importance-sampling weights."""
+        # Stratified sampling: one draw from each of batch_size equal segments
+        segment = self.tree.total / batch_size
+        values = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+        values = np.minimum(values, np.nextafter(self.tree.total, 0))
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+
+        probs = self.tree.get(indices) / self.tree.total
+        weights = (self.size * probs) ** -self.beta
+        weights /= weights.max()
+        self.sample_count += 1
+
+        batch = self._gather(indices)
+        return batch._replace(weights=weights.astype(np.float32), indices=indices)
+
+    def update_priorities(self, indices, td_errors):
+        """Set new priorities from the absolute TD errors of a sampled batch."""
+        priorities = np.abs(td_errors) + self.priority_eps
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(indices, priorities ** self.alpha)
+
+    def state_dict(self):
+        state = super().state_dict()
+        state["priorities"] = self.tree.get(np.arange(self.size))
+        state["max_priority"] = self.max_priority
+        state["sample_count"] = self.sample_count
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self.tree.update(np.arange(self.capacity), 0.0)
+        self.tree.update(np.arange(self.size), state["priorities"])
+        self.max_priority = float(state["max_priority"])
+        self.sample_count = int(state["sample_count"])
+
+
+class TorchReplayBuffer(ReplayBuffer):
+    """Uniform replay buffer whose storage and samples are torch tensors.
+
+    Storage is preallocated as CPU tensors, optionally in pinned memory so
+    the host-to-device copy in DQNAgent.update can be asynchronous.
+    sample() draws indices with torch.randint and gathers them with
+    index_select into preallocated output tensors, so a steady-state
+    sample allocates nothing and needs no NumPy-to-tensor conversion.
+    The returned Batch is overwritten by the next call to sample().
+    """
+
+    def __init__(self, capacity, obs_shape, obs_dtype=np.uint8, pin_memory=False):
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+        super().__init__(capacity, obs_shape, obs_dtype)
+        self._indices = None
+        self._out = None
+
+    def _allocate(self, name, shape, dtype):
+        """Allocate storage for one field across the whole capacity."""
+        storage = torch.from_numpy(np.zeros((self.capacity, *shape), dtype=dtype))
+        return storage.pin_memory() if self.pin_memory else storage
+
+    def _allocate_outputs(self, batch_size):
+        """Preallocate the index and output tensors for one batch size."""
+        self._indices = torch.empty(batch_size, dtype=torch.long)
+        self._out = Batch(*(
+            torch.empty(
+                (batch_size, *getattr(self, name).shape[1:]),
+                dtype=getattr(self, name).dtype,
+                pin_memory=self.pin_memory,
+            )
+            for name in self._fields
+        ))
+
+    def push(self, state, action, reward, next_state, done, discount):
+        """Store a transition."""
+        i = self.position
+        self.states[i] = torch.as_tensor(state)
+        self.actions[i] = int(action)
+        self.rewards[i] = float(reward)
+        self.next_states[i] = torch.as_tensor(next_state)
+        self.dones[i] = float(done)
+        self.discounts[i] = float(discount)
+        self._advance()
+
+    def _sample_indices(self, batch_size):
+        """Draw uniform indices into the preallocated index tensor."""
+        if self._indices is None or len(self._indices) != batch_size:
+            self._allocate_outputs(batch_size)
+        return torch.randint(0, self.size, (batch_size,), out=self._indices)
+
+    def _gather(self, indices):
+        """Gather the transitions at `indices` into the preallocated Batch."""
+        for name, out in zip(self._fields, self._out):
+            torch.index_select(getattr(self, name), 0, indices, out=out)
+        return self._out
+
+    def state_dict(self):
+        state = super().state_dict()
+        for name in self._fields:
+            state[name] = state[name].numpy()
+        return state
+
+    def load_state_dict(self, state):
+        state = dict(state)
+        for name in self._fields:
+            state[name] = torch.as_tensor(state[name])
+        super().load_state_dict(state)
+
+
+def make_replay_buffer(config, obs_shape, replay_dir=None):
+    """Create the replay buffer described by the agent config.
+
+    `replay_dir` is where memory-mapped storage lives when
+    agent.replay.storage is "memmap"; it is ignored otherwise. The files
+    there start empty on every run; --resume refills them from the last
+    snapshot.
+    """
+    agent_config = config["agent"]
+    replay_config = agent_config.get("replay", {})
+    layout = replay_config.get("layout", "transitions")
+    storage = replay_config.get("storage", "memory")
+
+    if storage == "torch":
+        if layout != "transitions" or replay_config.get("prioritized", False):
+            raise ValueError("Torch replay storage supports only uniform 'transitions' replay")
+        return TorchReplayBuffer(
+            agent_config["buffer_size"],
+            obs_shape,
+            pin_memory=replay_config.get("pin_memory", False),
+        )
+    if storage == "memory":
+        storage_dir = None
+    elif storage == "memmap":
+        if replay_dir is None:
+            raise ValueError("Memory-mapped replay storage needs a replay_dir")
+        storage_dir = replay_dir
+    else:
+        raise ValueError(f"Unknown replay storage: {storage}")
+
+    if replay_config.get("prioritized", False):
+        if layout != "transitions":
+            raise ValueError("Prioritized replay requires the 'transitions' layout")
+        return PrioritizedReplayBuffer(
+            agent_config["buffer_size"],
+            obs_shape,
+            storage_dir=storage_dir,
+            alpha=replay_config.get("alpha", 0.6),
+            beta_start=replay_config.get("beta_start", 0.4),
+            beta_anneal_steps=replay_config.get("beta_anneal_steps", 100000),
+            priority_eps=replay_config.get("priority_eps", 1e-6),
+        )
+    if layout == "transitions":
+        return ReplayBuffer(agent_config["buffer_size"], obs_shape, storage_dir=storage_dir)
+    if layout == "frames":
+        if config["env"].get("num_envs", 1) > 1:
+            raise ValueError("The 'frames' layout needs transitions from a single env (num_envs: 1)")
+        return FrameReplayBuffer(
+            agent_config["buffer_size"],
+            obs_shape,
+            storage_dir=storage_dir,
+            n_step=agent_config.get("n_step", 1),
+        )
+    raise ValueError(f"Unknown replay layout: {layout}")
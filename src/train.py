@@ -4,8 +4,10 @@ import os
 import time
 import csv
 import random
+import shutil
 import numpy as np
 import torch
+import yaml
 from pathlib import Path
 from torch.utils.tensorboard import SummaryWriter
 
@@ -16,8 +18,13 @@ os.environ["PYTHONUNBUFFERED"] = "1"
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from src.config import parse_args
-from src.env_utils import make_env
+from src.env_utils import make_env, make_vec_env, restore_vec_env, vec_env_state
 from src.dqn_agent import DQNAgent
+from src.actor_learner import ActorPool
+from src.checkpoint import CheckpointManager
+from src.eval_worker import EvalWorker, evaluate_network
+from src.log_writer import CSV_COLUMNS, BufferedLogWriter, NullSummaryWriter
+from src.profiler import NullProfiler, make_profiler
 
 
 def set_seed(seed):
@@ -27,62 +34,443 @@ def set_seed(seed):
     torch.manual_seed(seed)
 
 
+def get_rng_state():
+    """Capture the Python, NumPy and Torch RNG states."""
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+
+
+def set_rng_state(state):
+    """Restore RNG states captured by get_rng_state."""
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+
+
+def save_resume_state(output_dir, config, agent, envs, progress):
+    """Snapshot everything needed to continue the run into output_dir/resume.
+
+    The snapshot is written to a temporary directory and swapped in, so an
+    interrupted save never destroys the previous snapshot.
+    """
+    resume_dir = output_dir / "resume"
+    tmp_dir = output_dir / "resume.tmp"
+    old_dir = output_dir / "resume.old"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+
+    agent.save(tmp_dir / "agent.pt")
+    agent.buffer.save(tmp_dir / "replay")
+    torch.save({
+        "progress": progress,
+        "rng": get_rng_state(),
+        "n_step": agent.pending_state(),
+        # In-process sub-envs are pickled so episodes in progress continue exactly
+        "envs": vec_env_state(envs),
+    }, tmp_dir / "state.pt")
+    with open(tmp_dir / "config.yaml", "w") as f:
+        yaml.safe_dump({k: v for k, v in config.items() if k != "resume"}, f)
+
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if resume_dir.exists():
+        resume_dir.rename(old_dir)
+    tmp_dir.rename(resume_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def load_resume_state(output_dir, agent):
+    """Restore a snapshot written by save_resume_state.
+
+    Returns the saved progress and the pickled sub-envs (None if the run
+    used worker processes, whose episodes in progress cannot be restored).
+    """
+    resume_dir = output_dir / "resume"
+    if not resume_dir.exists():
+        # A save was interrupted between swapping the directories
+        resume_dir = output_dir / "resume.old"
+    if not resume_dir.exists():
+        raise FileNotFoundError(f"No resume snapshot found in {output_dir}")
+
+    agent.load(resume_dir / "agent.pt")
+    agent.buffer.load(resume_dir / "replay")
+    # Our own file: it holds pickled RNG states and envs, not just tensors
+    state = torch.load(resume_dir / "state.pt", weights_only=False)
+    set_rng_state(state["rng"])
+    if state["envs"] is not None:
+        agent.load_pending_state(state["n_step"])
+    return state["progress"], state["envs"]
+
+
 def evaluate(agent, config, num_episodes=20):
     """Evaluate agent without exploration."""
-    env = make_env(config, reward_shaping=False)  # Always evaluate without shaping
-    successes = 0
-    total_rewards = []
+    return evaluate_network(agent.q_network, config, num_episodes)
+
+
+class UpdateScheduler:
+    """Decides how many learner updates are owed after each env step.
+
+    By default gradient_steps updates run every train_every env steps. With
+    training.replay_ratio set, the number of updates instead tracks
+    replay_ratio * env steps, so fractional and >1 ratios both work.
+    Nothing is owed before learning_starts env steps.
+    """
+
+    def __init__(self, config):
+        self.train_every = config["training"].get("train_every", 4)
+        self.gradient_steps = config["training"].get("gradient_steps", 1)
+        self.learning_starts = config["training"].get("learning_starts", 0)
+        self.replay_ratio = config["training"].get("replay_ratio")
+        self.num_updates = 0
+
+    def describe(self):
+        if self.replay_ratio is not None:
+            rule = f"replay ratio {self.replay_ratio}"
+        else:
+            rule = f"{self.gradient_steps} every {self.train_every} env steps"
+        return f"{rule}, from env step {self.learning_starts}"
+
+    def take(self, env_steps):
+        """Number of updates to run now, after env_steps env steps in total."""
+        steps = env_steps - self.learning_starts
+        if steps < 0:
+            return 0
+        if self.replay_ratio is not None:
+            target = int(steps * self.replay_ratio)
+        else:
+            target = steps // self.train_every * self.gradient_steps
+        due = max(target - self.num_updates, 0)
+        self.num_updates += due
+        return due
+
+
+class EpisodeLogger:
+    """Per-episode TensorBoard, console and CSV logging.
+
+    Also runs the periodic evaluation and saves checkpoints. When resuming,
+    rows and events written after the snapshot in `progress` are dropped.
+
+    With training.total_steps set the run has an env-step budget instead of
+    num_episodes, and eval/log/save/resume frequencies count env steps.
+    They are checked as episodes finish, so each fires on the first episode
+    that ends past a multiple of its frequency.
+
+    With an eval_worker, evaluation runs in the background: results are
+    written to TensorBoard and eval_log.csv when they arrive, at the
+    episode the weights were taken from.
+
+    File and TensorBoard writes go through a BufferedLogWriter thread
+    (training.log_flush_every / log_flush_secs / log_columnar /
+    tensorboard), so record() itself does no I/O.
+
+    Checkpoints are written by a CheckpointManager (training.async_checkpoints,
+    keep_checkpoints). Evaluation, logging and checkpoint saves are timed
+    as phases of `profiler`. With a metrics_server, evaluation results also go to its
+    TrainingMetrics (`self.metrics`, which the training loop updates).
+    """
+
+    def __init__(self, config, output_dir, log_dir, progress=None, eval_worker=None, profiler=None,
+                 metrics_server=None):
+        self.config = config
+        self.profiler = profiler or NullProfiler()
+        self.metrics_server = metrics_server
+        self.metrics = metrics_server.metrics if metrics_server is not None else None
+        self.output_dir = output_dir
+        self.csv_path = output_dir / "training_log.csv"
+        self.eval_csv_path = output_dir / "eval_log.csv"
+        self.eval_worker = eval_worker
+        self.use_shaping = config["reward_shaping"]["enabled"]
+        self.num_episodes = config["training"]["num_episodes"]
+        self.step_budget = config["training"].get("total_steps")
+        self.eval_freq = config["training"]["eval_freq"]
+        self.log_freq = config["training"]["log_freq"]
+        self.save_freq = config["training"]["save_freq"]
+        self.resume_freq = config["training"].get("resume_freq", 0)
+        self.start_time = time.time()
+        # Episodes since the last console line
+        self.recent_rewards = []
+        self.recent_losses = []
+        # Episode (or env step) count at the previous record()
+        self.last_count = 0
+
+        training = config["training"]
+        if not training.get("tensorboard", True):
+            tb_writer = NullSummaryWriter()
+        elif progress is not None:
+            # Drop events written after the snapshot
+            tb_writer = SummaryWriter(str(log_dir), purge_step=progress["episode"] + 1)
+        else:
+            tb_writer = SummaryWriter(str(log_dir))
+
+        if progress is not None:
+            with open(self.csv_path, "r+") as f:
+                f.truncate(progress["csv_size"])
+            self.start_time -= progress["elapsed"]
+            self.recent_rewards = progress["recent_rewards"]
+            self.recent_losses = progress["recent_losses"]
+            self.last_count = progress["last_count"]
+            # The snapshot may come from a run with async_eval the other way
+            eval_csv_size = progress.get("eval_csv_size")
+            if eval_worker is not None and eval_csv_size is not None and self.eval_csv_path.exists():
+                with open(self.eval_csv_path, "r+") as f:
+                    f.truncate(eval_csv_size)
+            elif eval_worker is not None:
+                with open(self.eval_csv_path, "w", newline="") as f:
+                    csv.writer(f).writerow(["episode", "steps", "eval_success_rate", "eval_avg_reward"])
+        else:
+            with open(self.csv_path, "w", newline="") as f:
+                csv.writer(f).writerow(CSV_COLUMNS)
+            if eval_worker is not None:
+                with open(self.eval_csv_path, "w", newline="") as f:
+                    csv.writer(f).writerow(["episode", "steps", "eval_success_rate", "eval_avg_reward"])
+
+        self.checkpoints = CheckpointManager(
+            output_dir,
+            keep_last=training.get("keep_checkpoints"),
+            background=training.get("async_checkpoints", True),
+            store=training.get("checkpoint_store", False),
+        )
+        self.log_writer = BufferedLogWriter(
+            self.csv_path,
+            tb_writer,
+            npz_path=output_dir / "training_log.npz" if training.get("log_columnar", False) else None,
+            flush_every=training.get("log_flush_every", 50),
+            flush_secs=training.get("log_flush_secs", 10.0),
+            log_shaped=self.use_shaping,
+            resume_rows=progress.get("npz_rows") if progress is not None else None,
+        )
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def progress(self):
+        """Logging state to store in a resumable snapshot.
+
+        Waits for background evaluations and buffered records, so the
+        snapshot includes them.
+        """
+        if self.eval_worker is not None:
+            self._log_evals(self.eval_worker.poll(wait=True))
+        self.log_writer.flush(wait=True)
+        progress = {
+            "recent_rewards": self.recent_rewards,
+            "recent_losses": self.recent_losses,
+            "last_count": self.last_count,
+            "csv_size": self.csv_path.stat().st_size,
+            "npz_rows": self.log_writer.rows_written,
+        }
+        if self.eval_worker is not None:
+            progress["eval_csv_size"] = self.eval_csv_path.stat().st_size
+        progress["elapsed"] = self.elapsed()
+        return progress
+
+    def _log_evals(self, results):
+        """Log background evaluation results."""
+        for episode, total_steps, eval_sr, eval_ar in results:
+            print(f"Eval @ ep {episode} ({total_steps} steps) | SR {eval_sr:.2%} | R {eval_ar:.3f}", flush=True)
+            if self.metrics is not None:
+                self.metrics.eval_success_rate = eval_sr
+            self.log_writer.submit(self._write_eval, episode, total_steps, eval_sr, eval_ar)
+
+    def _write_eval(self, episode, total_steps, eval_sr, eval_ar):
+        """Runs on the log writer thread."""
+        self.log_writer.tb_writer.add_scalar("eval/success_rate", eval_sr, episode)
+        self.log_writer.tb_writer.add_scalar("eval/avg_reward", eval_ar, episode)
+        with open(self.eval_csv_path, "a", newline="") as f:
+            csv.writer(f).writerow([episode, total_steps, f"{eval_sr:.4f}", f"{eval_ar:.4f}"])
+
+    def done(self, episode, total_steps):
+        """Whether the episode or env-step budget is used up."""
+        if self.step_budget is not None:
+            return total_steps >= self.step_budget
+        return episode >= self.num_episodes
+
+    def _due(self, freq, count):
+        """Whether count passed a multiple of freq since the previous record()."""
+        return bool(freq) and count // freq > self.last_count // freq
+
+    def record(self, agent, episode, total_steps, episode_original_reward, episode_reward,
+               episode_length, avg_loss):
+        """Log one finished episode. Returns True when a resumable snapshot is due."""
+        count = episode if self.step_budget is None else total_steps
+        self.recent_rewards.append(episode_original_reward)
+        self.recent_losses.append(avg_loss)
+
+        # Evaluation
+        eval_sr, eval_ar = None, None
+        if self.eval_worker is not None:
+            with self.profiler.phase("evaluate"):
+                if self._due(self.eval_freq, count):
+                    self.eval_worker.submit(episode, total_steps, agent.q_network)
+                self._log_evals(self.eval_worker.poll())
+        elif self._due(self.eval_freq, count):
+            with self.profiler.phase("evaluate"):
+                eval_sr, eval_ar = evaluate(agent, self.config, self.config["training"]["eval_episodes"])
+            if self.metrics is not None:
+                self.metrics.eval_success_rate = eval_sr
+
+        with self.profiler.phase("logging"):
+            self._log_episode(agent, episode, total_steps, episode_original_reward, episode_reward,
+                              episode_length, avg_loss, count, eval_sr, eval_ar)
+
+        # Save checkpoint
+        if self._due(self.save_freq, count):
+            with self.profiler.phase("checkpoint"):
+                self.checkpoints.save(agent, f"checkpoint_ep{episode}")
+                agent.buffer.flush()
+
+        snapshot_due = self._due(self.resume_freq, count)
+        self.last_count = count
+        return snapshot_due
+
+    def _log_episode(self, agent, episode, total_steps, episode_original_reward, episode_reward,
+                     episode_length, avg_loss, count, eval_sr, eval_ar):
+        """Console line every log_freq, plus the buffered CSV/TensorBoard record."""
+        # Console logging
+        if self._due(self.log_freq, count):
+            avg_recent = np.mean(self.recent_rewards)
+            eps_per_sec = episode / self.elapsed()
+
+            if self.step_budget is None:
+                counts = f"Ep {episode:>6d}/{self.num_episodes} | Steps {total_steps:>8d}"
+            else:
+                counts = f"Ep {episode:>6d} | Steps {total_steps:>8d}/{self.step_budget}"
+            status = (
+                f"{counts} | "
+                f"Eps {agent.epsilon:.3f} | "
+                f"Avg R(100) {avg_recent:.3f} | "
+                f"Loss {np.mean(self.recent_losses):.4f}"
+            )
+            if eval_sr is not None:
+                status += f" | Eval SR {eval_sr:.2%} | Eval R {eval_ar:.3f}"
+            status += f" | {eps_per_sec:.0f} ep/s"
+            print(status, flush=True)
+            self.recent_rewards = []
+            self.recent_losses = []
 
-    for _ in range(num_episodes):
-        obs, _ = env.reset()
-        episode_reward = 0
-        done = False
+        # CSV + TensorBoard logging (buffered, written by the log writer thread)
+        self.log_writer.append(episode, total_steps, agent.epsilon, episode_original_reward, episode_length,
+                               avg_loss, eval_sr, eval_ar, episode_reward)
 
-        while not done:
-            action = agent.select_action(obs, evaluate=True)
-            obs, reward, terminated, truncated, info = env.step(action)
-            episode_reward += reward
-            done = terminated or truncated
+    def close(self):
+        if self.eval_worker is not None:
+            self._log_evals(self.eval_worker.close())
+        self.checkpoints.close()
+        self.log_writer.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
 
-        total_rewards.append(episode_reward)
-        if terminated and episode_reward > 0:
-            successes += 1
 
-    env.close()
-    return successes / num_episodes, np.mean(total_rewards)
+def make_eval_worker(config, obs_shape, n_actions):
+    """Background EvalWorker if training.async_eval is set, else None."""
+    if not config["training"].get("async_eval", False):
+        return None
+    return EvalWorker(config, obs_shape, n_actions, config["training"]["eval_episodes"])
+
+
+def make_metrics_server(config, exp_name, agent):
+    """MetricsServer on training.metrics_port if it is set, else None."""
+    port = config["training"].get("metrics_port")
+    if port is None:
+        return None
+    from src.metrics_server import MetricsServer, TrainingMetrics
+
+    metrics = TrainingMetrics(exp_name, agent.buffer.capacity)
+    server = MetricsServer(metrics, port, config["training"].get("metrics_host", "127.0.0.1"))
+    return server
+
+
+def setup_dirs(config):
+    """Create and return (exp_name, output_dir, log_dir) for a run."""
+    project_root = Path(__file__).resolve().parent.parent
+    if config.get("resume"):
+        output_dir = Path(config["resume"])
+        exp_name = output_dir.name
+    else:
+        exp_name = f"{config['experiment_name']}_seed{config['seed']}"
+        output_dir = Path(config.get("output_dir", project_root / "results")) / exp_name
+    log_dir = project_root / "logs" / exp_name
+    output_dir.mkdir(parents=True, exist_ok=True)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    return exp_name, output_dir, log_dir
+
+
+def finish_run(agent, config, logger, exp_name, output_dir, episode, total_steps):
+    """Save the final model, run the final evaluation and write final_results.txt."""
+    train_time = logger.elapsed()
+
+    # Final save
+    with agent.profiler.phase("checkpoint"):
+        logger.checkpoints.save(agent, "final_model")
+        agent.buffer.flush()
+    logger.close()
+    agent.profiler.close(output_dir)
+
+    # Final evaluation
+    print("\n--- Final Evaluation ---")
+    final_sr, final_ar = evaluate(agent, config, num_episodes=100)
+    print(f"Success Rate: {final_sr:.2%}")
+    print(f"Avg Reward:   {final_ar:.4f}")
+    print(f"Throughput:   {total_steps / train_time:.0f} env steps/s, {agent.num_updates / train_time:.1f} updates/s")
+
+    # Save final results
+    results_path = output_dir / "final_results.txt"
+    with open(results_path, "w") as f:
+        f.write(f"experiment: {exp_name}\n")
+        f.write(f"success_rate: {final_sr:.4f}\n")
+        f.write(f"avg_reward: {final_ar:.4f}\n")
+        f.write(f"total_episodes: {episode}\n")
+        f.write(f"total_steps: {total_steps}\n")
+        f.write(f"total_updates: {agent.num_updates}\n")
+        f.write(f"training_time: {train_time:.1f}s\n")
+        # Throughput over the training loop (excludes the final evaluation)
+        f.write(f"env_steps_per_sec: {total_steps / train_time:.1f}\n")
+        f.write(f"updates_per_sec: {agent.num_updates / train_time:.1f}\n")
+        f.write(f"samples_per_sec: {agent.num_updates * agent.batch_size / train_time:.1f}\n")
+
+    print(f"\nResults saved to {output_dir}")
+    return final_sr, final_ar
 
 
 def train(config):
     """Main training loop."""
+    if config["training"].get("num_actors", 0) > 0:
+        return train_actor_learner(config)
+
     seed = config["seed"]
     set_seed(seed)
 
     # Setup directories
-    project_root = Path(__file__).resolve().parent.parent
-    exp_name = f"{config['experiment_name']}_seed{seed}"
-    output_dir = Path(config.get("output_dir", project_root / "results")) / exp_name
-    log_dir = project_root / "logs" / exp_name
-    output_dir.mkdir(parents=True, exist_ok=True)
-    log_dir.mkdir(parents=True, exist_ok=True)
+    exp_name, output_dir, log_dir = setup_dirs(config)
 
-    # Create environment
+    # Create environments
     use_shaping = config["reward_shaping"]["enabled"]
-    env = make_env(config, reward_shaping=use_shaping)
+    envs = make_vec_env(config, reward_shaping=use_shaping)
+    num_envs = envs.num_envs
 
     # Create agent
-    obs_shape = env.observation_space.shape
-    n_actions = env.action_space.n
-    agent = DQNAgent(obs_shape, n_actions, config)
-
-    # Logging
-    writer = SummaryWriter(str(log_dir))
-    csv_path = output_dir / "training_log.csv"
-    with open(csv_path, "w", newline="") as f:
-        csv_writer = csv.writer(f)
-        csv_writer.writerow([
-            "episode", "steps", "epsilon", "episode_reward",
-            "episode_length", "loss", "eval_success_rate", "eval_avg_reward",
-        ])
+    obs_shape = envs.single_observation_space.shape
+    n_actions = envs.single_action_space.n
+    agent = DQNAgent(obs_shape, n_actions, config, replay_dir=output_dir / "replay")
+
+    # Resume from the last snapshot of an interrupted run
+    progress, saved_envs = None, None
+    if config.get("resume"):
+        progress, saved_envs = load_resume_state(output_dir, agent)
+        if saved_envs is not None:
+            envs.close()
+            envs = restore_vec_env(saved_envs)
+
+    # Logging and (opt-in) phase timings
+    profiler = make_profiler(config)
+    agent.profiler = profiler
+    logger = EpisodeLogger(config, output_dir, log_dir, progress,
+                           eval_worker=make_eval_worker(config, obs_shape, n_actions), profiler=profiler,
+                           metrics_server=make_metrics_server(config, exp_name, agent))
+    metrics = logger.metrics
+    scheduler = UpdateScheduler(config)
 
     print(f"Training: {exp_name}", flush=True)
     print(f"  Environment: {config['env']['name']}", flush=True)
@@ -90,124 +478,215 @@ def train(config):
     print(f"  Target Network: {config['agent']['use_target_network']}", flush=True)
     print(f"  Gamma: {config['agent']['gamma']}", flush=True)
     print(f"  Seed: {seed}")
+    print(f"  Envs: {num_envs} ({config['env'].get('vector_mode', 'sync')})")
+    print(f"  Updates: {scheduler.describe()}")
     print(f"  Output: {output_dir}")
+    if logger.metrics_server is not None:
+        print(f"  Metrics: {logger.metrics_server.url}")
+    if progress is not None:
+        print(f"  Resumed: episode {progress['episode']}, {len(agent.buffer)} transitions in replay")
     print()
 
-    start_time = time.time()
     total_steps = 0
-    recent_rewards = []
-    recent_losses = []
-
-    num_episodes = config["training"]["num_episodes"]
-    eval_freq = config["training"]["eval_freq"]
-    log_freq = config["training"]["log_freq"]
-    save_freq = config["training"]["save_freq"]
-
-    for episode in range(1, num_episodes + 1):
-        obs, _ = env.reset()
-        episode_reward = 0
-        episode_original_reward = 0
-        episode_length = 0
-        episode_loss = 0
-        loss_count = 0
-        done = False
-
-        while not done:
-            action = agent.select_action(obs)
-            next_obs, reward, terminated, truncated, info = env.step(action)
-            done = terminated or truncated
+    episode = 0
+
+    # Per-env statistics of the episodes in progress
+    episode_rewards = np.zeros(num_envs)
+    episode_original_rewards = np.zeros(num_envs)
+    episode_lengths = np.zeros(num_envs, dtype=np.int64)
+    # Losses since the last finished episode
+    loss_sum = 0.0
+    loss_count = 0
+
+    if progress is not None:
+        total_steps = progress["total_steps"]
+        episode = progress["episode"]
+        scheduler.num_updates = progress["num_updates"]
+    if saved_envs is not None:
+        obs = progress["obs"]
+        episode_rewards = progress["episode_rewards"]
+        episode_original_rewards = progress["episode_original_rewards"]
+        episode_lengths = progress["episode_lengths"]
+        loss_sum, loss_count = progress["loss_sum"], progress["loss_count"]
+    else:
+        obs, _ = envs.reset()
+
+    while not logger.done(episode, total_steps):
+        profiler.step()
+        with profiler.phase("select_action"):
+            actions = agent.select_actions(obs)
+        with profiler.phase("env_step"):
+            next_obs, rewards, terminated, truncated, infos = envs.step(actions)
+        dones = terminated | truncated
+
+        for i in range(num_envs):
+            # Finished sub-envs are already reset; their last step is in final_*
+            if dones[i]:
+                next_state = infos["final_observation"][i]
+                original_reward = infos["final_info"][i].get("original_reward", rewards[i])
+            else:
+                next_state = next_obs[i]
+                original_reward = infos["original_reward"][i] if "original_reward" in infos else rewards[i]
 
             # Track original reward for logging
-            original_reward = info.get("original_reward", reward)
-            episode_original_reward += original_reward
-
-            agent.store_transition(obs, action, reward, next_obs, float(done))
-            # Update every 4 steps to speed up training
-            loss = agent.update() if total_steps % 4 == 0 else None
+            episode_original_rewards[i] += original_reward
+            episode_rewards[i] += rewards[i]
+            episode_lengths[i] += 1
 
-            if loss is not None:
-                episode_loss += loss
-                loss_count += 1
-
-            obs = next_obs
-            episode_reward += reward
-            episode_length += 1
+            with profiler.phase("replay_push"):
+                agent.store_transition(obs[i], actions[i], rewards[i], next_state, float(dones[i]), env_id=i)
             total_steps += 1
+            agent.set_env_steps(total_steps)
+
+            for _ in range(scheduler.take(total_steps)):
+                loss = agent.update()
+                if loss is not None:
+                    loss_sum += loss
+                    loss_count += 1
+
+        obs = next_obs
+        if metrics is not None:
+            metrics.observe(episode, total_steps, agent.num_updates, agent.epsilon, len(agent.buffer))
+
+        snapshot_due = False
+        if dones.any():
+            avg_loss = loss_sum / max(loss_count, 1)
+            loss_sum, loss_count = 0.0, 0
+        for i in np.flatnonzero(dones):
+            episode += 1
+            episode_reward = episode_rewards[i]
+            episode_original_reward = episode_original_rewards[i]
+            episode_length = int(episode_lengths[i])
+            episode_rewards[i] = 0
+            episode_original_rewards[i] = 0
+            episode_lengths[i] = 0
+
+            if logger.record(agent, episode, total_steps, episode_original_reward, episode_reward,
+                             episode_length, avg_loss):
+                snapshot_due = True
+            # An episode budget stops at exactly num_episodes; with an env-step
+            # budget every episode that ended on the last step is still logged
+            if logger.step_budget is None and logger.done(episode, total_steps):
+                break
+
+        # Save resumable snapshot once every finished episode has been logged
+        if snapshot_due:
+            with profiler.phase("checkpoint"):
+                save_resume_state(output_dir, config, agent, envs, {
+                    **logger.progress(),
+                    "episode": episode,
+                    "total_steps": total_steps,
+                    "num_updates": scheduler.num_updates,
+                    "obs": obs,
+                    "episode_rewards": episode_rewards,
+                    "episode_original_rewards": episode_original_rewards,
+                    "episode_lengths": episode_lengths,
+                    "loss_sum": loss_sum,
+                    "loss_count": loss_count,
+                })
+
+    envs.close()
+    return finish_run(agent, config, logger, exp_name, output_dir, episode, total_steps)
+
+
+def train_actor_learner(config):
+    """Asynchronous training: actor processes collect, this process learns.
+
+    training.num_actors processes step their own envs with a copy of the
+    Q-network and stream n-step transitions over a queue. The learner
+    drains the queue into the replay buffer and runs DQNAgent.update
+    back to back (or as many times as training.replay_ratio allows),
+    publishing new weights every weight_sync_freq updates.
+    """
+    if config.get("resume"):
+        raise ValueError("--resume is not supported with training.num_actors")
+    if config["agent"].get("replay", {}).get("layout", "transitions") != "transitions":
+        raise ValueError("Actor-learner training needs replay.layout 'transitions'")
 
-        avg_loss = episode_loss / max(loss_count, 1)
-        recent_rewards.append(episode_original_reward)
-        recent_losses.append(avg_loss)
-
-        # TensorBoard logging
-        writer.add_scalar("train/episode_reward", episode_original_reward, episode)
-        writer.add_scalar("train/episode_length", episode_length, episode)
-        writer.add_scalar("train/epsilon", agent.epsilon, episode)
-        writer.add_scalar("train/loss", avg_loss, episode)
-        if use_shaping:
-            writer.add_scalar("train/shaped_reward", episode_reward, episode)
-
-        # Console + CSV logging
-        eval_sr, eval_ar = None, None
-        if episode % eval_freq == 0:
-            eval_sr, eval_ar = evaluate(agent, config, config["training"]["eval_episodes"])
-            writer.add_scalar("eval/success_rate", eval_sr, episode)
-            writer.add_scalar("eval/avg_reward", eval_ar, episode)
-
-        if episode % log_freq == 0:
-            avg_recent = np.mean(recent_rewards[-log_freq:])
-            elapsed = time.time() - start_time
-            eps_per_sec = episode / elapsed
-
-            status = (
-                f"Ep {episode:>6d}/{num_episodes} | "
-                f"Steps {total_steps:>8d} | "
-                f"Eps {agent.epsilon:.3f} | "
-                f"Avg R(100) {avg_recent:.3f} | "
-                f"Loss {np.mean(recent_losses[-log_freq:]):.4f}"
-            )
-            if eval_sr is not None:
-                status += f" | Eval SR {eval_sr:.2%} | Eval R {eval_ar:.3f}"
-            status += f" | {eps_per_sec:.0f} ep/s"
-            print(status, flush=True)
-
-        # CSV logging
-        with open(csv_path, "a", newline="") as f:
-            csv_writer = csv.writer(f)
-            csv_writer.writerow([
-                episode, total_steps, f"{agent.epsilon:.4f}",
-                f"{episode_original_reward:.4f}", episode_length,
-                f"{avg_loss:.6f}",
-                f"{eval_sr:.4f}" if eval_sr is not None else "",
-                f"{eval_ar:.4f}" if eval_ar is not None else "",
-            ])
-
-        # Save checkpoint
-        if episode % save_freq == 0:
-            agent.save(output_dir / f"checkpoint_ep{episode}.pt")
-
-    # Final save
-    agent.save(output_dir / "final_model.pt")
-    writer.close()
-    env.close()
-
-    # Final evaluation
-    print("\n--- Final Evaluation ---")
-    final_sr, final_ar = evaluate(agent, config, num_episodes=100)
-    print(f"Success Rate: {final_sr:.2%}")
-    print(f"Avg Reward:   {final_ar:.4f}")
+    seed = config["seed"]
+    set_seed(seed)
+    exp_name, output_dir, log_dir = setup_dirs(config)
+
+    probe_env = make_env(config)
+    obs_shape = probe_env.observation_space.shape
+    n_actions = probe_env.action_space.n
+    probe_env.close()
+    agent = DQNAgent(obs_shape, n_actions, config, replay_dir=output_dir / "replay")
+    profiler = make_profiler(config)
+    agent.profiler = profiler
+    logger = EpisodeLogger(config, output_dir, log_dir,
+                           eval_worker=make_eval_worker(config, obs_shape, n_actions), profiler=profiler,
+                           metrics_server=make_metrics_server(config, exp_name, agent))
+    metrics = logger.metrics
+    scheduler = UpdateScheduler(config)
+
+    num_actors = config["training"]["num_actors"]
+    weight_sync_freq = config["training"].get("weight_sync_freq", 100)
+    print(f"Training: {exp_name}", flush=True)
+    print(f"  Environment: {config['env']['name']}", flush=True)
+    print(f"  Reward Shaping: {config['reward_shaping']['enabled']}", flush=True)
+    print(f"  Target Network: {config['agent']['use_target_network']}", flush=True)
+    print(f"  Gamma: {config['agent']['gamma']}", flush=True)
+    print(f"  Seed: {seed}")
+    print(f"  Actors: {num_actors} x {config['env'].get('num_envs', 1)} envs, "
+          f"weights synced every {weight_sync_freq} updates")
+    if scheduler.replay_ratio is not None:
+        print(f"  Updates: {scheduler.describe()}")
+    print(f"  Output: {output_dir}")
+    if logger.metrics_server is not None:
+        print(f"  Metrics: {logger.metrics_server.url}")
+    print()
 
-    # Save final results
-    results_path = output_dir / "final_results.txt"
-    with open(results_path, "w") as f:
-        f.write(f"experiment: {exp_name}\n")
-        f.write(f"success_rate: {final_sr:.4f}\n")
-        f.write(f"avg_reward: {final_ar:.4f}\n")
-        f.write(f"total_episodes: {num_episodes}\n")
-        f.write(f"total_steps: {total_steps}\n")
-        f.write(f"training_time: {time.time() - start_time:.1f}s\n")
+    pool = ActorPool(config, obs_shape, n_actions, agent.q_network, agent.epsilon)
+    if pool.env_epsilons is not None:
+        agent.epsilon = float(pool.env_epsilons.mean())
 
-    print(f"\nResults saved to {output_dir}")
-    return final_sr, final_ar
+    total_steps = 0
+    episode = 0
+    num_due = 0
+    loss_sum = 0.0
+    loss_count = 0
+
+    while not logger.done(episode, total_steps):
+        profiler.step()
+        # Wait for actors while there is nothing to learn from
+        with profiler.phase("queue_poll"):
+            messages = pool.poll(block=num_due == 0 or len(agent.buffer) < agent.batch_size)
+        for kind, payload in messages:
+            if kind == "transitions":
+                with profiler.phase("replay_push"):
+                    for transition in zip(*payload):
+                        agent.buffer.push(*transition)
+                total_steps += len(payload[0])
+                agent.set_env_steps(total_steps)
+            elif kind == "episode":
+                episode += 1
+                episode_original_reward, episode_reward, episode_length = payload
+                avg_loss = loss_sum / max(loss_count, 1)
+                loss_sum, loss_count = 0.0, 0
+                logger.record(agent, episode, total_steps, episode_original_reward, episode_reward,
+                              episode_length, avg_loss)
+                if logger.done(episode, total_steps):
+                    break
+
+        if scheduler.replay_ratio is None:
+            num_due = int(total_steps >= scheduler.learning_starts)
+        else:
+            num_due = scheduler.take(total_steps)
+        for _ in range(num_due):
+            loss = agent.update()
+            if loss is not None:
+                loss_sum += loss
+                loss_count += 1
+                if agent.num_updates % weight_sync_freq == 0:
+                    with profiler.phase("weight_sync"):
+                        pool.sync(agent.q_network, agent.epsilon)
+        if metrics is not None:
+            metrics.observe(episode, total_steps, agent.num_updates, agent.epsilon, len(agent.buffer))
+
+    pool.close()
+    print(f"  Learner: {agent.num_updates} updates for {total_steps} transitions")
+    return finish_run(agent, config, logger, exp_name, output_dir, episode, total_steps)
 
 
 if __name__ == "__main__":
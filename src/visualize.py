@@ -12,7 +12,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 
 def load_training_log(csv_path):
-    """Load training log CSV."""
+    """Load training log CSV, with eval results from eval_log.csv (async_eval) merged in."""
     episodes, rewards, eval_srs, eval_rewards, losses = [], [], [], [], []
     with open(csv_path, "r") as f:
         reader = csv.DictReader(f)
@@ -24,6 +24,14 @@ def load_training_log(csv_path):
                 eval_srs.append((int(row["episode"]), float(row["eval_success_rate"])))
             if row["eval_avg_reward"]:
                 eval_rewards.append((int(row["episode"]), float(row["eval_avg_reward"])))
+    eval_csv_path = Path(csv_path).with_name("eval_log.csv")
+    if eval_csv_path.exists():
+        with open(eval_csv_path, "r") as f:
+            for row in csv.DictReader(f):
+                eval_srs.append((int(row["episode"]), float(row["eval_success_rate"])))
+                eval_rewards.append((int(row["episode"]), float(row["eval_avg_reward"])))
+        eval_srs.sort()
+        eval_rewards.sort()
     return {
         "episodes": np.array(episodes),
         "rewards": np.array(rewards),